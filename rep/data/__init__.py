@@ -2,4 +2,4 @@ from __future__ import division, print_function, absolute_import
 
 __author__ = 'Tatiana Likhomanenko'
 
-from .storage import LabeledDataStorage
+from .storage import LabeledDataStorage, MemmapDataStorage
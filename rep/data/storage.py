@@ -2,7 +2,10 @@
 This is wrapper for pandas.DataFrame, which allows you to define dataset for estimator by a simple way.
 """
 from __future__ import division, print_function, absolute_import
+from collections import OrderedDict
+import json
 import numbers
+import os
 
 from numpy.random.mtrand import RandomState
 import pandas
@@ -14,6 +17,8 @@ from ..utils import get_columns_dict, get_columns_in_df
 
 # generating random seeds in the interval [0, RANDINT)
 RANDINT = 10000000
+# name of file with description of saved storage
+MANIFEST_NAME = 'manifest.json'
 
 
 class LabeledDataStorage(object):
@@ -32,6 +37,10 @@ class LabeledDataStorage(object):
     :type random_state: None or int or RandomState
     :param bool shuffle: shuffle or not data
 
+    .. note:: when `shuffle=True`, each column, targets and weights are permuted only once (when requested first)
+        and kept in the storage. Repeated calls of `get_targets`, `get_weights` and `get_data` without features
+        return the same arrays and data frame (so they should not be modified in place),
+        `get_data` with features builds new data frame from the kept permuted columns.
     """
     def __init__(self, data, target=None, sample_weight=None, random_state=None, shuffle=False):
         self.data = data
@@ -43,6 +52,10 @@ class LabeledDataStorage(object):
         self._random_state = check_random_state(random_state).randint(RANDINT)
         self.shuffle = shuffle
         self._indices = None
+        self._shuffled_data = None
+        self._shuffled_frame = None
+        self._shuffled_target = None
+        self._shuffled_weight = None
 
     def _get_key(self, ds, key, allow_nones=False):
         """
@@ -82,11 +95,32 @@ class LabeledDataStorage(object):
 
         :rtype: pandas.DataFrame
         """
-        df = get_columns_in_df(self.data, features)
+        if not self.shuffle:
+            return get_columns_in_df(self.data, features)
 
-        if self.shuffle:
-            return df.irow(self.get_indices())
-        return df
+        shuffled_data = self._get_shuffled_data()
+        # permuted index of original data
+        index = self.data.index[self.get_indices()] if hasattr(self.data, 'index') else None
+        if features is None:
+            if self._shuffled_frame is None:
+                # taking columns without evaluation to keep non-numerical columns
+                columns = list(self.data.columns)
+                self._shuffled_frame = pandas.DataFrame(
+                    OrderedDict([(column, shuffled_data[column]) for column in columns]), columns=columns, index=index)
+            return self._shuffled_frame
+        result = get_columns_in_df(shuffled_data, features)
+        if index is not None:
+            result.index = index
+        return result
+
+    def _get_shuffled_data(self):
+        """
+        :return: columns of data permuted by storage indices
+        :rtype: _ShuffledColumns
+        """
+        if self._shuffled_data is None:
+            self._shuffled_data = _ShuffledColumns(self.data, self.get_indices())
+        return self._shuffled_data
 
     def get_targets(self):
         """
@@ -95,7 +129,9 @@ class LabeledDataStorage(object):
         :rtype: numpy.array
         """
         if self.shuffle:
-            return self.target[self.get_indices()]
+            if self._shuffled_target is None:
+                self._shuffled_target = self.target[self.get_indices()]
+            return self._shuffled_target
         return self.target
 
     def get_weights(self, allow_nones=False):
@@ -111,7 +147,9 @@ class LabeledDataStorage(object):
                 return numpy.ones(len(self.data))
         else:
             if self.shuffle:
-                return self.sample_weight[self.get_indices()]
+                if self._shuffled_weight is None:
+                    self._shuffled_weight = self.sample_weight[self.get_indices()]
+                return self._shuffled_weight
             return self.sample_weight
 
     def get_indices(self):
@@ -155,3 +193,204 @@ class LabeledDataStorage(object):
         else:
             assert len(expression) == len(self), 'Different length'
             return numpy.array(expression)
+
+    def save(self, path):
+        """
+        Save storage in columnar format: each column, targets and weights are written to separate .npy files,
+        `manifest.json` keeps names of columns, dtypes, shuffling and random seed.
+        Saved storage can be opened with :meth:`LabeledDataStorage.load`.
+
+        :param str path: folder to save storage in, will be created if doesn't exist
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        manifest = OrderedDict()
+        manifest['length'] = len(self)
+        manifest['columns'] = []
+        for index, column in enumerate(self.data.columns):
+            manifest['columns'].append(_save_column(path, 'column{}'.format(index), column, self.data[column]))
+        manifest['target'] = _save_column(path, 'target', 'target', self.target)
+        manifest['sample_weight'] = None
+        if self.sample_weight is not None:
+            manifest['sample_weight'] = _save_column(path, 'weight', 'sample_weight', self.sample_weight)
+        manifest['random_state'] = int(self._random_state)
+        manifest['shuffle'] = bool(self.shuffle)
+        with open(os.path.join(path, MANIFEST_NAME), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Open storage written by :meth:`LabeledDataStorage.save`
+
+        :param str path: folder with saved storage
+        :param bool mmap: if True, columns are memory-mapped and read from disk only when used
+            (:class:`MemmapDataStorage` is returned), otherwise all data is read into memory.
+
+        :rtype: LabeledDataStorage or MemmapDataStorage
+        """
+        with open(os.path.join(path, MANIFEST_NAME)) as manifest_file:
+            manifest = json.load(manifest_file, object_pairs_hook=OrderedDict)
+        mmap_mode = 'r' if mmap else None
+        columns = OrderedDict([(column['name'], os.path.join(path, column['file']))
+                               for column in manifest['columns']])
+        target = numpy.load(os.path.join(path, manifest['target']['file']), mmap_mode=mmap_mode)
+        sample_weight = manifest['sample_weight']
+        if sample_weight is not None:
+            sample_weight = numpy.load(os.path.join(path, sample_weight['file']), mmap_mode=mmap_mode)
+
+        if mmap:
+            lds = MemmapDataStorage(columns, target=target, sample_weight=sample_weight, shuffle=manifest['shuffle'])
+        else:
+            data = pandas.DataFrame(OrderedDict([(name, numpy.load(column_path))
+                                                 for name, column_path in columns.items()]),
+                                    columns=list(columns.keys()))
+            lds = LabeledDataStorage(data, target=target, sample_weight=sample_weight, shuffle=manifest['shuffle'])
+        assert len(lds) == manifest['length'], 'Saved storage is corrupted: lengths are different'
+        # restoring the same shuffling as in saved storage
+        lds._random_state = manifest['random_state']
+        return lds
+
+
+class _ShuffledColumns(object):
+    """
+    Columns of data permuted by indices. Supports the same part of pandas.DataFrame interface as
+    :class:`_MemmapColumns`. Each column is permuted when it is requested first and kept,
+    so calls of `get_data` with overlapping features share permuted columns.
+
+    :param data: data to be permuted
+    :type data: pandas.DataFrame or _MemmapColumns
+    :param numpy.array indices: permutation
+    """
+    def __init__(self, data, indices):
+        self.data = data
+        self.indices = indices
+        self._permuted = {}
+
+    @property
+    def columns(self):
+        return self.data.columns
+
+    def __getitem__(self, name):
+        if name not in self._permuted:
+            self._permuted[name] = numpy.asarray(self.data[name])[self.indices]
+        return self._permuted[name]
+
+    def __len__(self):
+        return len(self.indices)
+
+
+class _MemmapColumns(object):
+    """
+    Collection of columns, each column is kept in a separate .npy file.
+    Supports the part of pandas.DataFrame interface used by storages: `columns`, `__getitem__` and `__len__`
+    (which returns number of rows). Files are memory-mapped only when the column is requested.
+
+    :param paths: column name -> path to .npy file
+    :type paths: OrderedDict[str, str]
+    """
+    def __init__(self, paths):
+        self.paths = OrderedDict(paths)
+        self._opened = {}
+
+    @property
+    def columns(self):
+        return list(self.paths.keys())
+
+    def __getitem__(self, name):
+        if name not in self._opened:
+            self._opened[name] = numpy.load(self.paths[name], mmap_mode='r')
+        return self._opened[name]
+
+    def __len__(self):
+        if len(self.paths) == 0:
+            return 0
+        return len(self[self.columns[0]])
+
+    def __getstate__(self):
+        # opened memmaps are not pickled, they are reopened after loading
+        return {'paths': self.paths}
+
+    def __setstate__(self, state):
+        self.paths = state['paths']
+        self._opened = {}
+
+
+class MemmapDataStorage(LabeledDataStorage):
+    """
+    Out-of-core version of :class:`LabeledDataStorage`: each column of data is kept in a separate .npy file
+    and is memory-mapped, so only columns used in `get_data(features)`, `col` and `eval_column` are read from disk.
+    Can be used everywhere instead of :class:`LabeledDataStorage` (`fit_lds`, reports, ...).
+
+    Parameters:
+    -----------
+    :param columns: column name -> path to .npy file with this column
+    :type columns: OrderedDict[str, str]
+    :param target: labels for classification and values for regression (set None for predict methods)
+    :type target: None or numbers.Number or array-like or str
+    :param sample_weight: weight (set None for predict methods)
+    :type sample_weight: None or numbers.Number or array-like or str
+    :param random_state: for pseudo random generator
+    :type random_state: None or int or RandomState
+    :param bool shuffle: shuffle or not data
+
+    .. note:: only numerical columns are supported, `get_data()` without features reads all columns into memory.
+    """
+    def __init__(self, columns, target=None, sample_weight=None, random_state=None, shuffle=False):
+        LabeledDataStorage.__init__(self, _MemmapColumns(columns), target=target, sample_weight=sample_weight,
+                                    random_state=random_state, shuffle=shuffle)
+
+    @staticmethod
+    def from_dataframe(data, directory, target=None, sample_weight=None, random_state=None, shuffle=False):
+        """
+        Write columns of data frame to .npy files in directory and open them as :class:`MemmapDataStorage`
+
+        :param pandas.DataFrame data: data
+        :param str directory: folder to write columns in, will be created if doesn't exist
+        :param target: labels for classification and values for regression
+        :type target: None or numbers.Number or array-like or str
+        :param sample_weight: weight
+        :type sample_weight: None or numbers.Number or array-like or str
+        :param random_state: for pseudo random generator
+        :type random_state: None or int or RandomState
+        :param bool shuffle: shuffle or not data
+
+        :rtype: MemmapDataStorage
+        """
+        LabeledDataStorage(data, target=target, sample_weight=sample_weight, random_state=random_state,
+                           shuffle=shuffle).save(directory)
+        return LabeledDataStorage.load(directory, mmap=True)
+
+    def _get_key(self, ds, key, allow_nones=False):
+        if isinstance(key, numpy.memmap):
+            # keeping arrays on disk, not reading them into memory
+            return key
+        return LabeledDataStorage._get_key(self, ds, key, allow_nones=allow_nones)
+
+    def get_data(self, features=None):
+        """
+        Get data for estimator, only necessary columns are read from disk
+
+        :param features: set of feature names (if None then use all features in data storage)
+        :type features: None or list[str]
+
+        :rtype: pandas.DataFrame
+        """
+        if features is None:
+            features = self.data.columns
+        return LabeledDataStorage.get_data(self, features)
+
+
+def _save_column(directory, file_stem, name, values):
+    """
+    Write one-dimensional numerical array to .npy file
+
+    :return: OrderedDict, description of saved column for manifest
+    """
+    values = numpy.asarray(values)
+    assert values.ndim == 1, 'Only one-dimensional columns are supported, {} has shape {}'.format(name, values.shape)
+    assert values.dtype.kind in 'biuf', \
+        'Only numerical columns are supported, {} has dtype {}'.format(name, values.dtype)
+    file_name = file_stem + '.npy'
+    numpy.save(os.path.join(directory, file_name), values)
+    return OrderedDict([('name', name), ('file', file_name), ('dtype', values.dtype.str)])
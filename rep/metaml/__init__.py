@@ -1,10 +1,11 @@
 from __future__ import division, print_function, absolute_import
 
 from .factory import ClassifiersFactory, RegressorsFactory
-from .folding import FoldingClassifier
+from .folding import FoldingClassifier, FoldingRegressor
 from .gridsearch import GridOptimalSearchCV
-from .stacking import FeatureSplitter
+from .stacking import FeatureSplitter, StackingClassifier
 
 from .gridsearch import AbstractParameterGenerator, RandomParameterOptimizer, SubgridParameterOptimizer, \
-    RegressionParameterOptimizer, FoldingScorer
+    RegressionParameterOptimizer, GaussianProcessParameterOptimizer, ParetoParameterOptimizer, \
+    HalvingParameterOptimizer, FoldingScorer, FoldingScore
 
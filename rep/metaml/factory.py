@@ -97,16 +97,18 @@ class AbstractFactory(OrderedDict):
         pass
 
     @abstractmethod
-    def test_on_lds(self, lds):
+    def test_on_lds(self, lds, parallel_profile=None):
         """
         Prepare report for factory (comparison of all models).
 
         :param LabeledDataStorage lds: data
+        :param parallel_profile: profile of parallel execution system or None (used to compute predictions)
+        :type parallel_profile: None or str
         :rtype: rep.report.classification.ClassificationReport or rep.report.regression.RegressionReport
         """
         pass
 
-    def test_on(self, X, y, sample_weight=None):
+    def test_on(self, X, y, sample_weight=None, parallel_profile=None):
         """
         Prepare report for factory (comparison of all models).
 
@@ -114,11 +116,14 @@ class AbstractFactory(OrderedDict):
         :param y: numpy.array of shape [n_samples] with targets
         :param sample_weight: weight of events,
                array-like of shape [n_samples] or None if all weights are equal
+        :param parallel_profile: profile of parallel execution system or None (used to compute predictions)
+        :type parallel_profile: None or str
 
         :rtype: rep.report.classification.ClassificationReport or rep.report.regression.RegressionReport
         """
         from ..data import LabeledDataStorage
-        return self.test_on_lds(LabeledDataStorage(X, target=y, sample_weight=sample_weight))
+        return self.test_on_lds(LabeledDataStorage(X, target=y, sample_weight=sample_weight),
+                                parallel_profile=parallel_profile)
 
 
 class ClassifiersFactory(AbstractFactory):
@@ -217,14 +222,16 @@ class ClassifiersFactory(AbstractFactory):
                 pass
         return generators_dict
 
-    def test_on_lds(self, lds):
+    def test_on_lds(self, lds, parallel_profile=None):
         """
         Prepare report for factory of estimators
 
         :param LabeledDataStorage lds: data
+        :param parallel_profile: profile of parallel execution system or None (used to compute predictions)
+        :type parallel_profile: None or str
         :rtype: rep.report.classification.ClassificationReport
         """
-        return classification.ClassificationReport(self, lds)
+        return classification.ClassificationReport(self, lds, parallel_profile=parallel_profile)
 
 
 class RegressorsFactory(AbstractFactory):
@@ -295,14 +302,16 @@ class RegressorsFactory(AbstractFactory):
                 pass
         return generators_dict
 
-    def test_on_lds(self, lds):
+    def test_on_lds(self, lds, parallel_profile=None):
         """
         Report for factory of estimators
 
         :param LabeledDataStorage lds: data
+        :param parallel_profile: profile of parallel execution system or None (used to compute predictions)
+        :type parallel_profile: None or str
         :rtype: rep.report.regression.RegressionReport
         """
-        return regression.RegressionReport(self, lds)
+        return regression.RegressionReport(self, lds, parallel_profile=parallel_profile)
 
 
 def train_estimator(name, estimator, X, y, sample_weight=None):
@@ -3,7 +3,10 @@ This is specific meta-algorithm based on the idea of cross-validation.
 """
 from __future__ import division, print_function, absolute_import
 
+import zlib
+
 import numpy
+import six
 from sklearn import clone
 
 from six.moves import zip
@@ -11,40 +14,33 @@ from . import utils
 from sklearn.cross_validation import KFold
 from sklearn.utils.validation import check_random_state
 from .factory import train_estimator
-from ..estimators.interface import Classifier
-from ..estimators.utils import check_inputs
+from ..estimators.interface import Classifier, Regressor
+from ..estimators.utils import check_inputs, _get_features
 
 __author__ = 'Tatiana Likhomanenko'
 
 
-class FoldingClassifier(Classifier):
+class FoldingBase(object):
     """
-    This meta-classifier implements folding algorithm:
-
-    * training data is splitted into n equal parts;
-
-    * then n times union of n-1 parts is used to train classifier;
-
-    * at the end we have n-estimators, which are used to classify new events
-
-
-    To build unbiased predictions for data, pass the **same** dataset (with same order of events)
-    as in training to `predict`, `predict_proba` or `staged_predict_proba`, in which case
-    classifier will use to predict each event that base classifier which didn't use that event during training.
-
-    To use information from not one, but several classifiers during predictions,
-    provide appropriate voting function.
+    Base class for folding meta-algorithms, which contains splitting into folds,
+    parallel training of folds' estimators and combining of their predictions
+    (folds' estimators are evaluated in parallel by `predict` and `predict_proba`, but not by staged predictions).
 
     Parameters:
     -----------
-    :param sklearn.BaseEstimator base_estimator: base classifier, which will be used for training
+    :param sklearn.BaseEstimator base_estimator: base estimator, which will be used for training
     :param int n_folds: count of folds
     :param features: features used in training
     :type features: None or list[str]
-    :param ipc_profile: profile for IPython cluster, None to compute locally.
+    :param ipc_profile: profile for IPython cluster, 'threads-N' or 'processes-N' for local pool,
+        None to compute locally.
     :type ipc_profile: None or str
     :param random_state: random state for reproducibility
     :type random_state: None or int or RandomState
+    :param fold_columns: column or columns identifying event, used to assign folds by hash.
+        If None, folds are assigned by position of event in dataset.
+        These columns are not used in training if features are None.
+    :type fold_columns: None or str or list[str]
     """
 
     def __init__(self,
@@ -52,8 +48,9 @@ class FoldingClassifier(Classifier):
                  n_folds=2,
                  random_state=None,
                  features=None,
-                 ipc_profile=None):
-        super(FoldingClassifier, self).__init__(features=features)
+                 ipc_profile=None,
+                 fold_columns=None):
+        super(FoldingBase, self).__init__(features=features)
 
         self.estimators = []
         self.ipc_profile = ipc_profile
@@ -61,65 +58,195 @@ class FoldingClassifier(Classifier):
         self.base_estimator = base_estimator
         self._folds_indices = None
         self.random_state = random_state
+        self.fold_columns = fold_columns
         self._random_number = None
+        self._folds_column = None
+        # features used in training if fold columns are excluded from them, `features` is left unchanged
+        self._features = None
+
+    def _get_fold_columns(self):
+        if isinstance(self.fold_columns, six.string_types):
+            return [self.fold_columns]
+        return list(self.fold_columns)
 
-    def _get_folds_column(self, length):
+    def _get_folds_column(self, X):
+        """
+        :param pandas.DataFrame X: data before selection of features
+        :return: numpy.array of shape [n_samples] with fold index for each event
+        """
         if self._random_number is None:
             self._random_number = check_random_state(self.random_state).randint(0, 100000)
-        folds_column = numpy.zeros(length)
-        for fold_number, (_, folds_indices) in enumerate(
-                KFold(length, self.n_folds, shuffle=True, random_state=self._random_number)):
-            folds_column[folds_indices] = fold_number
-        return folds_column
+        if self.fold_columns is not None:
+            return _hash_folds(X, self._get_fold_columns(), self._random_number, self.n_folds)
+        # positional folds depend only on length of data, so they are computed once
+        if self._folds_column is None or len(self._folds_column) != len(X):
+            folds_column = numpy.zeros(len(X))
+            for fold_number, (_, folds_indices) in enumerate(
+                    KFold(len(X), self.n_folds, shuffle=True, random_state=self._random_number)):
+                folds_column[folds_indices] = fold_number
+            self._folds_column = folds_column
+        return self._folds_column
 
-    def fit(self, X, y, sample_weight=None):
+    def _get_features(self, X, allow_nans=False):
         """
-        Train the classifier, will train several base classifiers on overlapping
-        subsets of training dataset.
-
-        :param X: pandas.DataFrame of shape [n_samples, n_features]
-        :param y: labels of events - array-like of shape [n_samples]
-        :param sample_weight: weight of events,
-               array-like of shape [n_samples] or None if all weights are equal
+        :param pandas.DataFrame X: dataset
+        :return: pandas.DataFrame with features used in training (without fold columns, if features are None)
         """
+        if self._features is None:
+            return super(FoldingBase, self)._get_features(X, allow_nans=allow_nans)
+        X_prepared, _ = _get_features(self._features, X, allow_nans=allow_nans)
+        return X_prepared
+
+    def _prepare_data(self, X, y, sample_weight):
         if hasattr(self.base_estimator, 'features'):
             assert self.base_estimator.features is None, 'Base estimator must have None features! ' \
                                                          'Use features parameter in Folding to fix it'
         X, y, sample_weight = check_inputs(X, y, sample_weight=sample_weight, allow_none_weights=True)
+        self._features = None
+        if self.fold_columns is not None and self.features is None:
+            self._features = [column for column in X.columns if column not in self._get_fold_columns()]
+        folds_column = self._get_folds_column(X)
         X = self._get_features(X)
-        self._set_classes(y)
-        folds_column = self._get_folds_column(len(X))
+        return X, y, sample_weight, folds_column
 
-        for _ in range(self.n_folds):
-            self.estimators.append(clone(self.base_estimator))
+    def _fit_folds(self, X, y, sample_weight, folds_column):
+        self.estimators = [clone(self.base_estimator) for _ in range(self.n_folds)]
 
-        if sample_weight is None:
-            weights_iterator = (None for _ in range(self.n_folds))
-        else:
-            weights_iterator = (sample_weight[folds_column != index] for index in range(self.n_folds))
-
-        result = utils.map_on_cluster(self.ipc_profile, train_estimator,
+        # the same data is passed for all folds, training subset is selected by the worker just before training,
+        # so the copies of data are not created for all folds at once
+        result = utils.map_on_cluster(self.ipc_profile, _train_fold,
                                       range(len(self.estimators)),
                                       self.estimators,
-                                      (X.iloc[folds_column != index, :].copy() for index in range(self.n_folds)),
-                                      (y[folds_column != index] for index in range(self.n_folds)),
-                                      weights_iterator)
+                                      [X] * self.n_folds,
+                                      [y] * self.n_folds,
+                                      [sample_weight] * self.n_folds,
+                                      [folds_column] * self.n_folds)
         for status, data in result:
             if status == 'success':
-                name, classifier, spent_time = data
-                self.estimators[name] = classifier
+                name, estimator, spent_time = data
+                self.estimators[name] = estimator
             else:
                 print('Problem while training on the node, report:\n', data)
         return self
 
+    def _predict(self, X, vote_function, method, n_classes=None):
+        """
+        Predictions of folds' estimators combined by folding scheme or vote function.
+        Estimators are evaluated in parallel using `ipc_profile`.
+
+        :param str method: 'predict_proba' or 'predict'
+        :param n_classes: number of classes for 'predict_proba', None for 'predict'
+        """
+        if vote_function is not None:
+            print('Using voting KFold prediction')
+            X = self._get_features(X)
+            n_estimators = len(self.estimators)
+            args = (_predict_estimator, self.estimators, [X] * n_estimators,
+                    [method] * n_estimators, [n_classes] * n_estimators)
+            if vote_function in _INCREMENTAL_VOTES:
+                # order of folds doesn't matter for these votes
+                return _vote_incrementally(vote_function, utils.imap_on_cluster(self.ipc_profile, *args))
+            # predictions: [n_estimators, n_samples, ...], reduction over 0th axis
+            predictions = numpy.array(list(utils.map_on_cluster(self.ipc_profile, *args)))
+            return _get_vote_function(vote_function)(predictions)
+        else:
+            print('KFold prediction using folds column')
+            folds_column = self._get_folds_column(X)
+            X = self._get_features(X)
+            # small chunk of data with folds assigned by hash may contain no events of some folds
+            folds = [fold for fold in range(len(self.estimators)) if numpy.any(folds_column == fold)]
+            n_folds = len(folds)
+            result = numpy.zeros((len(X),) if n_classes is None else (len(X), n_classes))
+            for fold, prediction in utils.imap_on_cluster(self.ipc_profile, _predict_fold, folds,
+                                                          [self.estimators[fold] for fold in folds], [X] * n_folds,
+                                                          [folds_column] * n_folds,
+                                                          [method] * n_folds, [n_classes] * n_folds):
+                result[folds_column == fold] = prediction
+            return result
+
+    def _staged_predict(self, X, vote_function, method):
+        """
+        Staged predictions of folds' estimators combined by folding scheme or vote function.
+        Stages are iterated sequentially in this process, `ipc_profile` is not used,
+        since iterators over stages can't be sent to workers.
+
+        :param str method: 'staged_predict_proba' or 'staged_predict'
+        """
+        if vote_function is not None:
+            print('Using voting KFold prediction')
+            X = self._get_features(X)
+            iterators = [getattr(estimator, method)(X) for estimator in self.estimators]
+            for fold_predictions in zip(*iterators):
+                if vote_function in _INCREMENTAL_VOTES:
+                    yield _vote_incrementally(vote_function, fold_predictions)
+                else:
+                    yield _get_vote_function(vote_function)(numpy.array(fold_predictions))
+        else:
+            print('Default prediction')
+            folds_column = self._get_folds_column(X)
+            X = self._get_features(X)
+            folds = [fold for fold in range(self.n_folds) if numpy.any(folds_column == fold)]
+            iterators = [getattr(self.estimators[fold], method)(X.iloc[folds_column == fold, :]) for fold in folds]
+            for fold_predictions in zip(*iterators):
+                predictions = numpy.zeros((len(X),) + numpy.shape(fold_predictions[0])[1:])
+                for fold, fold_prediction in zip(folds, fold_predictions):
+                    predictions[folds_column == fold] = fold_prediction
+                yield predictions
+
+
+class FoldingClassifier(FoldingBase, Classifier):
+    """
+    This meta-classifier implements folding algorithm:
+
+    * training data is splitted into n equal parts;
+
+    * then n times union of n-1 parts is used to train classifier;
+
+    * at the end we have n-estimators, which are used to classify new events
+
+
+    To build unbiased predictions for data, pass the **same** dataset (with same order of events)
+    as in training to `predict`, `predict_proba` or `staged_predict_proba`, in which case
+    classifier will use to predict each event that base classifier which didn't use that event during training.
+
+    To use information from not one, but several classifiers during predictions,
+    provide appropriate voting function.
+
+    If `fold_columns` are given, fold of event is computed from hash of these columns (i.e. event id),
+    so unbiased predictions are obtained for training events passed in any order and in any chunks.
+
+    Parameters:
+    -----------
+    :param sklearn.BaseEstimator base_estimator: base classifier, which will be used for training
+    :param int n_folds: count of folds
+    :param features: features used in training
+    :type features: None or list[str]
+    :param ipc_profile: profile for IPython cluster, None to compute locally.
+    :type ipc_profile: None or str
+    :param random_state: random state for reproducibility
+    :type random_state: None or int or RandomState
+    :param fold_columns: column or columns identifying event, used to assign folds by hash.
+        If None, folds are assigned by position of event in dataset.
+        These columns are not used in training if features are None.
+    :type fold_columns: None or str or list[str]
+    """
+
+    def fit(self, X, y, sample_weight=None):
+        """
+        Train the classifier, will train several base classifiers on overlapping
+        subsets of training dataset.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :param y: labels of events - array-like of shape [n_samples]
+        :param sample_weight: weight of events,
+               array-like of shape [n_samples] or None if all weights are equal
+        """
+        X, y, sample_weight, folds_column = self._prepare_data(X, y, sample_weight)
+        self._set_classes(y)
+        return self._fit_folds(X, y, sample_weight, folds_column)
+
     def _get_estimators_proba(self, estimator, data):
-        try:
-            return estimator.predict_proba(data)
-        except AttributeError:
-            probabilities = numpy.zeros(shape=(len(data), self.n_classes_))
-            labels = estimator.predict(data)
-            probabilities[numpy.arange(len(labels)), labels] = 1
-            return probabilities
+        return _get_estimator_proba(estimator, data, self.n_classes_)
 
     def predict(self, X, vote_function=None):
         """
@@ -127,9 +254,10 @@ class FoldingClassifier(Classifier):
         (with same order of events) and vote_function=None.
 
         :param X: pandas.DataFrame of shape [n_samples, n_features]
-        :param vote_function: function to combine prediction of folds' estimators.
+        :param vote_function: function to combine prediction of folds' estimators or name of built-in vote
+            ('mean', 'geometric_mean', 'median', 'max', 'min').
             If None then folding scheme is used. Parameters: numpy.ndarray [n_classifiers, n_samples]
-        :type vote_function: None or function, if None, will use folding scheme.
+        :type vote_function: None or str or function, if None, will use folding scheme.
         :rtype: numpy.array of shape [n_samples, n_classes] with labels
         """
         proba = self.predict_proba(X, vote_function=vote_function)
@@ -141,30 +269,18 @@ class FoldingClassifier(Classifier):
         (with same order of events) and vote_function=None.
 
         :param X: pandas.DataFrame of shape [n_samples, n_features]
-        :param vote_function: function to combine prediction of folds' estimators.
-            If None then self.vote_function is used. Parameters: numpy.ndarray [n_classifiers, n_samples, n_classes]
-        :type vote_function: None or function
+        :param vote_function: function to combine prediction of folds' estimators or name of built-in vote
+            ('mean', 'geometric_mean', 'median', 'max', 'min').
+            If None then folding scheme is used. Parameters: numpy.ndarray [n_classifiers, n_samples, n_classes]
+        :type vote_function: None or str or function
+
+        Folds' estimators are evaluated in parallel using `ipc_profile`.
+        Built-in votes (except median) are computed incrementally while predictions of estimators arrive,
+        without keeping predictions of all estimators in memory.
 
         :rtype: numpy.array of shape [n_samples, n_classes] with probabilities
         """
-        if vote_function is not None:
-            print('Using voting KFold prediction')
-            X = self._get_features(X)
-            probabilities = []
-            for classifier in self.estimators:
-                probabilities.append(self._get_estimators_proba(classifier, X))
-            # probabilities: [n_classifiers, n_samples, n_classes], reduction over 0th axis
-            probabilities = numpy.array(probabilities)
-            return vote_function(probabilities)
-        else:
-            print('KFold prediction using folds column')
-            X = self._get_features(X)
-            folds_column = self._get_folds_column(len(X))
-            probabilities = numpy.zeros(shape=(len(X), self.n_classes_))
-            for fold in range(self.n_folds):
-                prob = self._get_estimators_proba(self.estimators[fold], X.iloc[folds_column == fold, :])
-                probabilities[folds_column == fold] = prob
-            return probabilities
+        return self._predict(X, vote_function, 'predict_proba', n_classes=self.n_classes_)
 
     def staged_predict_proba(self, X, vote_function=None):
         """
@@ -172,27 +288,226 @@ class FoldingClassifier(Classifier):
         (with same order of events) and vote_function=None.
 
         :param X: pandas.DataFrame of shape [n_samples, n_features]
-        :param vote_function: function to combine prediction of folds' estimators.
-            If None then self.vote_function is used.
-        :type vote_function: None or function
+        :param vote_function: function to combine prediction of folds' estimators or name of built-in vote
+            ('mean', 'geometric_mean', 'median', 'max', 'min').
+            If None then folding scheme is used.
+        :type vote_function: None or str or function
+
+        Folds' estimators are evaluated sequentially, `ipc_profile` is not used.
 
         :return: iterator for numpy.array of shape [n_samples, n_classes] with probabilities
         """
-        if vote_function is not None:
-            print('Using voting KFold prediction')
-            X = self._get_features(X)
-            iterators = [estimator.staged_predict_proba(X) for estimator in self.estimators]
-            for fold_prob in zip(*iterators):
-                probabilities = numpy.array(fold_prob)
-                yield vote_function(probabilities)
+        return self._staged_predict(X, vote_function, 'staged_predict_proba')
+
+
+class FoldingRegressor(FoldingBase, Regressor):
+    """
+    This meta-regressor implements folding algorithm:
+
+    * training data is splitted into n equal parts;
+
+    * then n times union of n-1 parts is used to train regressor;
+
+    * at the end we have n-estimators, which are used to predict new events
+
+
+    To build unbiased predictions for data, pass the **same** dataset (with same order of events)
+    as in training to `predict` or `staged_predict`, in which case
+    regressor will use to predict each event that base regressor which didn't use that event during training.
+
+    To use information from not one, but several regressors during predictions,
+    provide appropriate voting function.
+
+    If `fold_columns` are given, fold of event is computed from hash of these columns (i.e. event id),
+    so unbiased predictions are obtained for training events passed in any order and in any chunks.
+
+    Parameters:
+    -----------
+    :param sklearn.BaseEstimator base_estimator: base regressor, which will be used for training
+    :param int n_folds: count of folds
+    :param features: features used in training
+    :type features: None or list[str]
+    :param ipc_profile: profile for IPython cluster, 'threads-N' or 'processes-N' for local pool,
+        None to compute locally.
+    :type ipc_profile: None or str
+    :param random_state: random state for reproducibility
+    :type random_state: None or int or RandomState
+    :param fold_columns: column or columns identifying event, used to assign folds by hash.
+        If None, folds are assigned by position of event in dataset.
+        These columns are not used in training if features are None.
+    :type fold_columns: None or str or list[str]
+    """
+
+    def fit(self, X, y, sample_weight=None):
+        """
+        Train the regressor, will train several base regressors on overlapping
+        subsets of training dataset.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :param y: values - array-like of shape [n_samples]
+        :param sample_weight: weight of events,
+               array-like of shape [n_samples] or None if all weights are equal
+        """
+        X, y, sample_weight, folds_column = self._prepare_data(X, y, sample_weight)
+        return self._fit_folds(X, y, sample_weight, folds_column)
+
+    def predict(self, X, vote_function=None):
+        """
+        Predict values. To get unbiased predictions, you can pass training dataset
+        (with same order of events) and vote_function=None.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :param vote_function: function to combine prediction of folds' estimators or name of built-in vote
+            ('mean', 'geometric_mean', 'median', 'max', 'min').
+            If None then folding scheme is used. Parameters: numpy.ndarray [n_regressors, n_samples]
+        :type vote_function: None or str or function
+
+        :rtype: numpy.array of shape [n_samples] with predicted values
+        """
+        return self._predict(X, vote_function, 'predict')
+
+    def staged_predict(self, X, vote_function=None):
+        """
+        Predict values on each stage. To get unbiased predictions, you can pass training dataset
+        (with same order of events) and vote_function=None.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :param vote_function: function to combine prediction of folds' estimators or name of built-in vote
+            ('mean', 'geometric_mean', 'median', 'max', 'min').
+            If None then folding scheme is used.
+        :type vote_function: None or str or function
+
+        Folds' estimators are evaluated sequentially, `ipc_profile` is not used.
+
+        :return: iterator for numpy.array of shape [n_samples] with predicted values
+        """
+        return self._staged_predict(X, vote_function, 'staged_predict')
+
+
+def _train_fold(fold, estimator, X, y, sample_weight, folds_column):
+    """
+    Supplementary function.
+    Trains estimator on all folds except given one.
+
+    :param int fold: index of fold, which is not used in training
+    :param folds_column: numpy.array of shape [n_samples] with index of fold for each event
+    :return: the same as :func:`train_estimator`
+    """
+    train_mask = folds_column != fold
+    if sample_weight is not None:
+        sample_weight = sample_weight[train_mask]
+    return train_estimator(fold, estimator, X.iloc[train_mask, :], y[train_mask], sample_weight)
+
+
+def _mix_hash(values):
+    """ splitmix64 finalizer, vectorized over numpy.array of uint64 """
+    with numpy.errstate(over='ignore'):
+        values = values + numpy.uint64(0x9E3779B97F4A7C15)
+        values = (values ^ (values >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+        return values ^ (values >> numpy.uint64(31))
+
+
+def _hash_column(values):
+    """
+    Stable hash of column, doesn't depend on other events, so the same event always gets the same hash.
+    Integer numbers stored as floats have the same hash as integers.
+    """
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'biu':
+        return values.astype(numpy.int64).view(numpy.uint64)
+    if values.dtype.kind == 'f':
+        values = values.astype(numpy.float64)
+        result = values.view(numpy.uint64).copy()
+        integral = numpy.isfinite(values) & (values == numpy.round(values)) & (numpy.abs(values) < 2. ** 63)
+        result[integral] = values[integral].astype(numpy.int64).view(numpy.uint64)
+        return result
+    return numpy.array([zlib.crc32(six.text_type(value).encode('utf-8')) & 0xffffffff for value in values],
+                       dtype=numpy.uint64)
+
+
+def _hash_folds(X, columns, seed, n_folds):
+    """
+    :return: numpy.array of shape [n_samples] with fold index computed from hash of columns
+    """
+    hashes = _mix_hash(numpy.zeros(len(X), dtype=numpy.uint64) + numpy.uint64(seed))
+    for column in columns:
+        hashes = _mix_hash(hashes ^ _hash_column(X[column]))
+    return (hashes % numpy.uint64(n_folds)).astype(numpy.int64)
+
+
+def _predict_estimator(estimator, data, method, n_classes):
+    """
+    Supplementary function.
+    Predicts by estimator with given method ('predict_proba' or 'predict').
+    """
+    if method == 'predict_proba':
+        return _get_estimator_proba(estimator, data, n_classes)
+    return getattr(estimator, method)(data)
+
+
+def _predict_fold(fold, estimator, X, folds_column, method, n_classes):
+    """
+    Supplementary function.
+    Predicts events of given fold by estimator, which didn't use this fold in training.
+
+    :return: fold, predictions
+    """
+    return fold, _predict_estimator(estimator, X.iloc[folds_column == fold, :], method, n_classes)
+
+
+def _get_estimator_proba(estimator, data, n_classes):
+    """
+    Supplementary function.
+    Predicts probabilities, estimators without predict_proba give probability 1 for predicted class.
+    """
+    try:
+        return estimator.predict_proba(data)
+    except AttributeError:
+        probabilities = numpy.zeros(shape=(len(data), n_classes))
+        labels = estimator.predict(data)
+        probabilities[numpy.arange(len(labels)), labels] = 1
+        return probabilities
+
+
+def _log_proba(probabilities):
+    with numpy.errstate(divide='ignore'):
+        return numpy.log(probabilities)
+
+
+# votes computed incrementally: name -> (transformation of predictions, accumulation, final transformation)
+_INCREMENTAL_VOTES = {
+    'mean': (None, numpy.add, lambda total, n: total / n),
+    'geometric_mean': (_log_proba, numpy.add, lambda total, n: numpy.exp(total / n)),
+    'max': (None, numpy.maximum, lambda total, n: total),
+    'min': (None, numpy.minimum, lambda total, n: total),
+}
+
+
+def _vote_incrementally(vote, predictions):
+    """
+    Combines predictions of estimators keeping in memory only one buffer of shape [n_samples, ...]
+
+    :param str vote: name of vote from _INCREMENTAL_VOTES
+    :param predictions: iterable over predictions of estimators
+    """
+    transform, accumulate, finalize = _INCREMENTAL_VOTES[vote]
+    total = None
+    n_predictions = 0
+    for prediction in predictions:
+        if transform is not None:
+            prediction = transform(prediction)
+        if total is None:
+            total = numpy.array(prediction, dtype=float)
         else:
-            print('Default prediction')
-            X = self._get_features(X)
-            folds_column = self._get_folds_column(len(X))
-            iterators = [self.estimators[fold].staged_predict_proba(X.iloc[folds_column == fold, :])
-                         for fold in range(self.n_folds)]
-            for fold_prob in zip(*iterators):
-                probabilities = numpy.zeros(shape=(len(X), 2))
-                for fold in range(self.n_folds):
-                    probabilities[folds_column == fold] = fold_prob[fold]
-                yield probabilities
+            accumulate(total, prediction, out=total)
+        n_predictions += 1
+    return finalize(total, n_predictions)
+
+
+def _get_vote_function(vote_function):
+    if vote_function == 'median':
+        # median can't be computed incrementally, predictions of all estimators are used
+        return lambda probabilities: numpy.median(probabilities, axis=0)
+    assert callable(vote_function), 'Unknown vote function: {}'.format(vote_function)
+    return vote_function
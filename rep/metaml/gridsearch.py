@@ -2,24 +2,40 @@
 This module does hyper parameters optimization -- find the best parameters for estimator using different optimization models.
 """
 
-# TODO think of pareto-optimization
-
 from __future__ import division, print_function, absolute_import
 from itertools import islice
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from functools import reduce
 import logging
+import operator
+import numbers
+import sqlite3
+import threading
+import weakref
+from timeit import default_timer
 
 from sklearn.base import clone
 import numpy
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.stats import norm
 from sklearn.cross_validation import StratifiedKFold
 from sklearn.ensemble.forest import RandomForestRegressor
 from sklearn.utils.random import check_random_state
 
-from six.moves import zip
+from six.moves import zip, cPickle
 from ..estimators.utils import check_inputs
+from ..utils import get_fingerprint
+from .utils import broadcast, is_local_profile, LocalPool, map_on_cluster
 
 __author__ = 'Alex Rogozhnikov, Tatiana Likhomanenko'
 
+# time in seconds between checks of finished evaluations
+_POLLING_INTERVAL = 0.05
+
+# costs of model measured by FoldingScorer: training time (seconds), prediction time (seconds per event)
+# and size of pickled model (bytes)
+_COST_NAMES = ('train_time', 'predict_time', 'model_size')
+
 
 class AbstractParameterGenerator(object):
     """
@@ -34,6 +50,9 @@ class AbstractParameterGenerator(object):
     :param random_state: random generator
     :type random_state: int or RandomState or None
     """
+    # if False, next point can't be generated before results for all generated points are added,
+    # so points are evaluated one by one in parallel search
+    supports_batch = True
 
     def __init__(self, param_grid, n_evaluations=10, random_state=None):
         assert isinstance(param_grid, dict), 'the passed param_grid should be of OrderedDict class'
@@ -41,9 +60,10 @@ class AbstractParameterGenerator(object):
         _check_param_grid(param_grid)
 
         self.dimensions = list([len(param_values) for param, param_values in self.param_grid.items()])
-        size = numpy.prod(self.dimensions)
+        size = reduce(operator.mul, self.dimensions, 1)
         assert size > 1, 'The space of parameters contains only %i points' % size
         self.n_evaluations = min(n_evaluations, size)
+        self._grid_size = size
 
         # results on different parameters
         self.grid_scores_ = OrderedDict()
@@ -53,6 +73,14 @@ class AbstractParameterGenerator(object):
         self.random_state = check_random_state(random_state)
         self.evaluations_done = 0
 
+        # random points are taken from lazy random permutation of grid,
+        # points generated with enqueue=False are used again after the permutation is exhausted
+        self._permutation = None
+        self._permutation_position = 0
+        self._released_points = deque()
+        # all points of grid, used by surrogate-based optimizers
+        self._all_points = None
+
     def _indices_to_parameters(self, state_indices):
         """
         Point in parameter space kept as sequence of indices, i.e.:
@@ -67,13 +95,51 @@ class AbstractParameterGenerator(object):
         return OrderedDict([(name, values[i]) for i, (name, values) in zip(state_indices, self.param_grid.items())])
 
     def _generate_random_point(self, enqueue=True):
+        """
+        Generates random point, which is not queued. Each point of grid is taken once from random permutation,
+        so there are no repeated attempts, and the time doesn't depend on how many points are queued.
+
+        :param bool enqueue: if False, point is not added to queued tasks and may be generated again
+        """
+        if len(self.queued_tasks_) >= self._grid_size:
+            raise RuntimeError("The grid is exhausted, cannot generate more points")
         while True:
-            result = tuple([self.random_state.randint(0, size) for size in self.dimensions])
+            if self._permutation_position < self._grid_size:
+                if self._permutation is None:
+                    self._permutation = _FeistelPermutation(self._grid_size, self.random_state)
+                result = _unravel_index(self._permutation[self._permutation_position], self.dimensions)
+                self._permutation_position += 1
+            else:
+                result = self._released_points.popleft()
+            # points may be queued not only by this function (i.e. by optimizers exploring neighbours)
             if result not in self.queued_tasks_:
                 if enqueue:
                     self.queued_tasks_.add(result)
+                else:
+                    self._released_points.append(result)
                 return result
 
+    def _get_candidates(self, n_candidates):
+        """
+        Returns array of shape [n_points, n_parameters] with points, which are not queued:
+        all such points if grid contains not more than n_candidates points, otherwise stratified random sample
+        (each value of each parameter occurs in sample the same number of times up to one).
+
+        :param int n_candidates: maximal number of points in sample
+        """
+        if self._grid_size <= n_candidates:
+            if self._all_points is None:
+                self._all_points = numpy.array(numpy.unravel_index(numpy.arange(self._grid_size),
+                                                                   self.dimensions)).T
+            not_queued = numpy.ones(self._grid_size, dtype=bool)
+            if len(self.queued_tasks_) > 0:
+                not_queued[numpy.ravel_multi_index(numpy.array(list(self.queued_tasks_), dtype=int).T,
+                                                   self.dimensions)] = False
+            return self._all_points[not_queued]
+        candidates = numpy.array([self.random_state.permutation(numpy.arange(n_candidates) % dimension)
+                                  for dimension in self.dimensions]).T
+        return candidates[[tuple(point) not in self.queued_tasks_ for point in candidates]]
+
     def generate_next_point(self):
         """Generating next random point in parameters space"""
         raise NotImplementedError('Should be overriden by descendant')
@@ -88,7 +154,11 @@ class AbstractParameterGenerator(object):
         # may be overriden in descendants
         state_indices = []
         for _ in range(size):
-            state_indices.append(self.generate_next_point())
+            point = self.generate_next_point()
+            if point is None:
+                # generator waits for results of generated points
+                break
+            state_indices.append(point)
         return zip(*state_indices)
 
     def add_result(self, state_indices, value):
@@ -127,7 +197,10 @@ class AbstractParameterGenerator(object):
         for state_indices, value in sequence:
             state_string = ", ".join([name_value[0] + '=' + str(name_value[1]) for name_value
                                       in self._indices_to_parameters(state_indices).items()])
-            print("{0:.3f}:  {1}".format(value, state_string))
+            if isinstance(value, FoldingScore):
+                print("{0:.3f} +- {1:.3f}:  {2}".format(value, value.std, state_string))
+            else:
+                print("{0:.3f}:  {1}".format(value, state_string))
 
 
 class RandomParameterOptimizer(AbstractParameterGenerator):
@@ -136,7 +209,7 @@ class RandomParameterOptimizer(AbstractParameterGenerator):
     """
     def generate_next_point(self):
         """Generating next random point in parameters space"""
-        if len(self.queued_tasks_) >= numpy.prod(self.dimensions):
+        if len(self.queued_tasks_) >= self._grid_size:
             raise RuntimeError("The grid is exhausted, cannot generate more points")
         new_state_indices = self._generate_random_point()
         return new_state_indices, self._indices_to_parameters(new_state_indices)
@@ -147,6 +220,11 @@ class RegressionParameterOptimizer(AbstractParameterGenerator):
     To generate next point of grid regressor will be used to estimate score for all next point in such way
     that the point with the best estimated score will be chosen
 
+    Regressor is trained only when new results arrive, its predictions for all points of grid
+    (or for stratified sample of max_candidates points, if the grid is larger) are computed at once
+    and the points are taken in order of predicted score until new results arrive.
+    So generate_batch_points returns the best distinct points according to the same predictions.
+
     Parameters:
     ----------
     :param OrderedDict param_grid: the grid with parameters to optimize on
@@ -155,13 +233,14 @@ class RegressionParameterOptimizer(AbstractParameterGenerator):
     :type random_state: int or RandomState or None
 
     :param int start_evaluations: count of random point generation on start
-    :param int n_attempts:
+    :param int n_attempts: not used, kept for compatibility
     :param regressor: regressor to choose appropriate next point with potential best score
         (estimated this score by regressor); If None them RandomForest algorithm will be used.
+    :param int max_candidates: maximal number of points, for which score is estimated
     """
 
     def __init__(self, param_grid, n_evaluations=10, random_state=None,
-                 start_evaluations=3, n_attempts=5, regressor=None):
+                 start_evaluations=3, n_attempts=5, regressor=None, max_candidates=100000):
         AbstractParameterGenerator.__init__(self, param_grid=param_grid, n_evaluations=n_evaluations,
                                             random_state=random_state)
         if regressor is None:
@@ -169,35 +248,114 @@ class RegressionParameterOptimizer(AbstractParameterGenerator):
         self.regressor = regressor
         self.n_attempts = n_attempts
         self.start_evaluations = start_evaluations
+        self.max_candidates = max_candidates
+        # candidates ordered by predicted score and number of results used to train regressor
+        self._ranked_candidates = []
+        self._ranking_position = 0
+        self._n_ranked_results = None
+
+    def _rank_candidates(self):
+        X = numpy.array([list(x) for x in self.grid_scores_.keys()], dtype=int)
+        y = list(self.grid_scores_.values())
+        regressor = clone(self.regressor).fit(X, y)
+        candidates = self._get_candidates(self.max_candidates)
+        self._ranked_candidates = candidates[numpy.argsort(-regressor.predict(candidates), kind='mergesort')]
+        self._ranking_position = 0
+        self._n_ranked_results = len(self.grid_scores_)
 
     def generate_next_point(self):
-        """Generating next random point in parameters space"""
-        if len(self.queued_tasks_) > numpy.prod(self.dimensions) + self.n_attempts:
+        """Generating next point in parameters space with the best predicted score"""
+        if len(self.queued_tasks_) >= self._grid_size:
             raise RuntimeError("The grid is exhausted, cannot generate more points")
 
-        if len(self.queued_tasks_) < self.start_evaluations:
+        if len(self.queued_tasks_) < self.start_evaluations or len(self.grid_scores_) == 0:
             new_state_indices = self._generate_random_point()
             return new_state_indices, self._indices_to_parameters(new_state_indices)
 
-        # Training regressor
-        X = numpy.array([list(x) for x in self.grid_scores_.keys()], dtype=int)
-        y = list(self.grid_scores_.values())
-        regressor = clone(self.regressor).fit(X, y)
+        if self._n_ranked_results != len(self.grid_scores_):
+            self._rank_candidates()
+        while True:
+            if self._ranking_position >= len(self._ranked_candidates):
+                # sample of large grid is exhausted, new sample is taken
+                self._rank_candidates()
+            new_state_indices = tuple(int(index) for index in self._ranked_candidates[self._ranking_position])
+            self._ranking_position += 1
+            # points of stratified sample may repeat
+            if new_state_indices not in self.queued_tasks_:
+                break
 
-        # generating candidates
-        candidates = numpy.array([list(self._generate_random_point(enqueue=False))
-                                  for _ in range(self.n_attempts)], dtype=int)
-        # winning candidate index
-        index = regressor.predict(candidates).argmax()
+        # remember the task
+        self.queued_tasks_.add(new_state_indices)
+        return new_state_indices, self._indices_to_parameters(new_state_indices)
 
-        new_state_indices = tuple(candidates[index, :])
 
-        # remember the task
+class GaussianProcessParameterOptimizer(AbstractParameterGenerator):
+    """
+    Bayesian optimization: score is modelled by gaussian process over indices of parameters,
+    next point is the one with maximal expected improvement. Predictions of gaussian process are computed
+    for all remaining points of grid at once
+    (if the grid is larger than max_candidates, for stratified random sample of points).
+
+    Points which are being evaluated are taken into account with 'constant liar' strategy:
+    until the result is known, score in the point is supposed to be equal to mean of obtained scores.
+    So points of the batch (and points generated while others are computed on cluster) are spread over the grid.
+
+    Parameters:
+    ----------
+    :param OrderedDict param_grid: the grid with parameters to optimize on
+    :param int n_evaluations: the number of evaluations to do
+    :param random_state: random generator
+    :type random_state: int or RandomState or None
+
+    :param int start_evaluations: count of random point generation on start
+    :param float xi: exploration parameter, expected improvement is computed over best score + xi * std of scores
+    :param list length_scales: possible length scales of kernel (for parameters indices normalized to [0, 1]),
+        the one with the best marginal likelihood is used
+    :param float noise: noise level of gaussian process (relative to variance of scores)
+    :param int max_candidates: maximal number of points, for which expected improvement is computed
+    """
+
+    def __init__(self, param_grid, n_evaluations=10, random_state=None, start_evaluations=3, xi=0.01,
+                 length_scales=(0.1, 0.2, 0.4, 0.8), noise=1e-4, max_candidates=10000):
+        AbstractParameterGenerator.__init__(self, param_grid=param_grid, n_evaluations=n_evaluations,
+                                            random_state=random_state)
+        self.start_evaluations = start_evaluations
+        self.xi = xi
+        self.length_scales = length_scales
+        self.noise = noise
+        self.max_candidates = max_candidates
+        self._scale = 1. / numpy.maximum(numpy.array(self.dimensions) - 1, 1)
+
+    def generate_next_point(self):
+        """Generating next point in parameters space with maximal expected improvement"""
+        if len(self.queued_tasks_) >= self._grid_size:
+            raise RuntimeError("The grid is exhausted, cannot generate more points")
+
+        candidates = None
+        if len(self.queued_tasks_) >= self.start_evaluations and len(self.grid_scores_) > 0:
+            candidates = self._get_candidates(self.max_candidates)
+        if candidates is None or len(candidates) == 0:
+            new_state_indices = self._generate_random_point()
+            return new_state_indices, self._indices_to_parameters(new_state_indices)
+
+        scores = numpy.array(list(self.grid_scores_.values()), dtype=float)
+        pending = [key for key in self.queued_tasks_ if key not in self.grid_scores_]
+        X = numpy.array(list(self.grid_scores_.keys()) + pending, dtype=float) * self._scale
+        y = numpy.concatenate([scores, numpy.repeat(numpy.mean(scores), len(pending))])
+        mean, std = _predict_gaussian_process(X, y, candidates * self._scale,
+                                              length_scales=self.length_scales, noise=self.noise)
+        improvement = mean - numpy.max(scores) - self.xi * numpy.std(scores)
+        z = improvement / std
+        expected_improvement = improvement * norm.cdf(z) + std * norm.pdf(z)
+
+        new_state_indices = tuple(int(index) for index in candidates[numpy.argmax(expected_improvement)])
         self.queued_tasks_.add(new_state_indices)
         return new_state_indices, self._indices_to_parameters(new_state_indices)
 
 
 class AnnealingParameterOptimizer(AbstractParameterGenerator):
+    supports_batch = False
+
     def __init__(self, param_grid, n_evaluations=10, temperature=0.2, random_state=None):
         """
         Implementation if annealing algorithm
@@ -209,7 +367,7 @@ class AnnealingParameterOptimizer(AbstractParameterGenerator):
         :param temperature: float, how tolerant we are to worse results.
         If it is very small, will never step to point with worse predictions.
 
-        Doesn't support parallel execution, so cannot be used in optimization on cluster.
+        Doesn't support parallel execution, so points are evaluated one by one in optimization on cluster.
         """
         AbstractParameterGenerator.__init__(self, param_grid=param_grid,
                                             n_evaluations=n_evaluations,
@@ -291,7 +449,7 @@ class SubgridParameterOptimizer(AbstractParameterGenerator):
 
     def generate_next_point(self):
         """Generating next point in parameters space"""
-        if len(self.queued_tasks_) >= numpy.prod(self.dimensions):
+        if len(self.queued_tasks_) >= self._grid_size:
             raise RuntimeError("The grid is exhausted, cannot generate more points")
 
         # trying to generate from subgrid
@@ -336,8 +494,335 @@ class SubgridParameterOptimizer(AbstractParameterGenerator):
             self.grid_scores_[state_indices] = value
 
 
+class ParetoParameterOptimizer(AbstractParameterGenerator):
+    """
+    Multi-objective optimization: looks for points on pareto front of quality and costs of model
+    (i.e. prediction time), such that there is no other point with better quality and lower costs.
+    Costs are taken from scores computed by :class:`FoldingScorer` (see :class:`FoldingScore`).
+
+    Each next point maximizes random scalarization (augmented Chebyshev) of objectives predicted by regressors,
+    so different points are directed to different parts of front. Regressors are trained only when new results arrive,
+    objectives are predicted for all points of grid at once
+    (for stratified sample of points, if the grid is larger than max_candidates).
+
+    Parameters:
+    ----------
+    :param OrderedDict param_grid: the grid with parameters to optimize on
+    :param int n_evaluations: the number of evaluations to do
+    :param random_state: random generator
+    :type random_state: int or RandomState or None
+
+    :param int start_evaluations: count of random point generation on start
+    :param list cost_names: costs to minimize: 'train_time', 'predict_time' (per event) and/or 'model_size'
+    :param regressor: regressor to predict objectives, if None RandomForest algorithm will be used.
+    :param int max_candidates: maximal number of points, for which objectives are predicted
+    """
+
+    def __init__(self, param_grid, n_evaluations=10, random_state=None, start_evaluations=5,
+                 cost_names=('predict_time',), regressor=None, max_candidates=100000):
+        AbstractParameterGenerator.__init__(self, param_grid=param_grid, n_evaluations=n_evaluations,
+                                            random_state=random_state)
+        if regressor is None:
+            regressor = RandomForestRegressor(max_depth=3, n_estimators=10, max_features=0.7,
+                                              random_state=self.random_state)
+        self.regressor = regressor
+        self.start_evaluations = start_evaluations
+        self.cost_names = list(cost_names)
+        self.max_candidates = max_candidates
+        # costs for points: indices -> dict
+        self.costs_ = OrderedDict()
+        # normalized predicted objectives of candidates and number of results used to train regressors
+        self._candidates = None
+        self._predictions = None
+        self._available = None
+        self._n_predicted_results = None
+
+    def add_result(self, state_indices, value):
+        costs = getattr(value, 'costs', {})
+        missing = [name for name in self.cost_names if name not in costs]
+        if len(missing) > 0:
+            raise ValueError('Score has no costs {}, use FoldingScorer to measure them'.format(missing))
+        self.grid_scores_[state_indices] = value
+        self.costs_[state_indices] = OrderedDict([(name, costs[name]) for name in self.cost_names])
+
+    def _get_utilities(self):
+        """
+        :return: array of shape [n_results, 1 + n_costs] with score and minus logarithms of costs
+        """
+        costs = numpy.array([list(costs.values()) for costs in self.costs_.values()], dtype=float)
+        costs = costs.reshape(len(self.costs_), len(self.cost_names))
+        # unknown costs (i.e. model couldn't be pickled) are treated as the largest ones
+        for column in costs.T:
+            known = column[~numpy.isnan(column)]
+            column[numpy.isnan(column)] = numpy.max(known) if len(known) > 0 else 1.
+        scores = numpy.array(list(self.grid_scores_.values()), dtype=float)
+        return numpy.column_stack([scores, -numpy.log(numpy.maximum(costs, 1e-12))])
+
+    def _predict_objectives(self):
+        X = numpy.array(list(self.grid_scores_.keys()), dtype=int)
+        utilities = self._get_utilities()
+        self._candidates = self._get_candidates(self.max_candidates)
+        predictions = numpy.array([clone(self.regressor).fit(X, column).predict(self._candidates)
+                                   for column in utilities.T]).T
+        low, high = utilities.min(axis=0), utilities.max(axis=0)
+        self._predictions = (predictions - low) / numpy.maximum(high - low, 1e-10)
+        self._available = numpy.ones(len(self._candidates), dtype=bool)
+        self._n_predicted_results = len(self.grid_scores_)
+
+    def generate_next_point(self):
+        """Generating next point in parameters space, which is expected to be on pareto front"""
+        if len(self.queued_tasks_) >= self._grid_size:
+            raise RuntimeError("The grid is exhausted, cannot generate more points")
+
+        if len(self.queued_tasks_) < self.start_evaluations or len(self.grid_scores_) < 2:
+            new_state_indices = self._generate_random_point()
+            return new_state_indices, self._indices_to_parameters(new_state_indices)
+
+        if self._n_predicted_results != len(self.grid_scores_):
+            self._predict_objectives()
+        weights = self.random_state.dirichlet(numpy.ones(self._predictions.shape[1]))
+        scalarized = numpy.min(self._predictions * weights, axis=1) + 0.05 * self._predictions.dot(weights)
+        while True:
+            if not numpy.any(self._available):
+                # sample of large grid is exhausted, new sample is taken
+                self._predict_objectives()
+                scalarized = numpy.min(self._predictions * weights, axis=1) + 0.05 * self._predictions.dot(weights)
+            index = numpy.argmax(numpy.where(self._available, scalarized, -numpy.inf))
+            self._available[index] = False
+            new_state_indices = tuple(int(i) for i in self._candidates[index])
+            if new_state_indices not in self.queued_tasks_:
+                break
+
+        self.queued_tasks_.add(new_state_indices)
+        return new_state_indices, self._indices_to_parameters(new_state_indices)
+
+    @property
+    def pareto_front_(self):
+        """
+        Property, return list of tuples (parameters, objectives) for points on pareto front
+        ordered by decreasing score, objectives is dict with score and costs
+        """
+        return _get_pareto_front([(self._indices_to_parameters(key),
+                                   OrderedDict([('score', score)] + list(self.costs_[key].items())))
+                                  for key, score in self.grid_scores_.items()])
+
+
+class HalvingParameterOptimizer(AbstractParameterGenerator):
+    """
+    Successive halving: many points are evaluated with small budget (i.e. small number of trees),
+    the best 1/eta of points evaluated with some budget are promoted to the next (larger) budget and so on.
+
+    Asynchronous variant of algorithm (ASHA) is used: point is promoted as soon as it is in the top 1/eta
+    among evaluated with its budget, so there is no need to wait for all points of budget
+    and parallel evaluation on cluster doesn't stall.
+
+    Budget is added to grid as the last parameter, so keys of `grid_scores_` contain index of budget as last element.
+    Best parameters are chosen among points evaluated with the largest budget.
+
+    Parameters:
+    ----------
+    :param OrderedDict param_grid: the grid with parameters to optimize on
+    :param int n_evaluations: the number of evaluations to do (with all budgets)
+    :param random_state: random generator
+    :type random_state: int or RandomState or None
+
+    :param str budget_param: name of estimator's parameter, which determines budget (i.e. 'n_estimators')
+    :param list budgets: increasing values of budget parameter
+    :param int eta: the fraction of points promoted to the next budget is 1 / eta
+    """
+
+    def __init__(self, param_grid, n_evaluations=10, random_state=None,
+                 budget_param='n_estimators', budgets=(10, 30, 90), eta=3):
+        assert budget_param not in param_grid, 'Budget parameter should not be in grid'
+        assert len(budgets) >= 2, 'At least two budgets should be passed'
+        param_grid = OrderedDict(param_grid)
+        param_grid[budget_param] = list(budgets)
+        AbstractParameterGenerator.__init__(self, param_grid=param_grid, n_evaluations=n_evaluations,
+                                            random_state=random_state)
+        self.budget_param = budget_param
+        self.budgets = list(budgets)
+        self.eta = eta
+        # results for each budget: point indices (without budget) -> score
+        self.budget_scores_ = [OrderedDict() for _ in self.budgets]
+        self._promoted = [set() for _ in self.budgets]
+        self._n_points = reduce(operator.mul, self.dimensions[:-1], 1)
+        # new points are taken from random permutation of grid without budget
+        self._new_points = None
+        self._n_started = 0
+
+    def _generate_new_point(self):
+        if self._new_points is None:
+            self._new_points = _FeistelPermutation(self._n_points, self.random_state)
+        result = _unravel_index(self._new_points[self._n_started], self.dimensions[:-1])
+        self._n_started += 1
+        return result
+
+    def _find_promotion(self, only_top=True):
+        """
+        :param bool only_top: if False, the best of not promoted points is returned even if it is not in top
+        :return: (point indices, budget index) for promoted point or None
+        """
+        for budget in range(len(self.budgets) - 2, -1, -1):
+            scores = self.budget_scores_[budget]
+            n_top = len(scores) // self.eta if only_top else len(scores)
+            ranked = sorted(scores, key=lambda point: -scores[point])[:n_top]
+            for point in ranked:
+                if point not in self._promoted[budget]:
+                    return point, budget + 1
+        return None
+
+    def generate_next_point(self):
+        """
+        Generating next point in parameters space: promoted one or a new point with the smallest budget.
+
+        :return: (state_indices, parameters) or None if all new points are generated
+            and promotion is possible only after results of generated points are added
+        """
+        promotion = self._find_promotion()
+        if promotion is None:
+            if self._n_started < self._n_points:
+                promotion = self._generate_new_point(), 0
+            else:
+                promotion = self._find_promotion(only_top=False)
+        if promotion is None:
+            if len(self.grid_scores_) < len(self.queued_tasks_):
+                return None
+            raise RuntimeError("The grid is exhausted, cannot generate more points")
+        point, budget = promotion
+        if budget > 0:
+            self._promoted[budget - 1].add(point)
+        state_indices = point + (budget,)
+        self.queued_tasks_.add(state_indices)
+        return state_indices, self._indices_to_parameters(state_indices)
+
+    def add_result(self, state_indices, value):
+        self.grid_scores_[state_indices] = value
+        self.budget_scores_[state_indices[-1]][state_indices[:-1]] = value
+
+    def _best_key(self):
+        # scores obtained with different budgets are not comparable, so the largest evaluated budget is used
+        budget = max(key[-1] for key in self.grid_scores_)
+        return max([key for key in self.grid_scores_ if key[-1] == budget], key=lambda key: self.grid_scores_[key])
+
+    @property
+    def best_score_(self):
+        """
+        Property, return best score obtained with the largest evaluated budget
+        """
+        return self.grid_scores_[self._best_key()]
+
+    @property
+    def best_params_(self):
+        """
+        Property, return point of parameters grid with the best score obtained with the largest evaluated budget
+        """
+        return self._indices_to_parameters(self._best_key())
+
+
 # region supplementary functions
 
+class _FeistelPermutation(object):
+    """
+    Pseudo-random permutation of range(size), which is computed lazily: element with given index is obtained
+    in constant time without storing the permutation. Feistel network is a bijection of numbers
+    with even number of bits (not less than needed for size), values outside of range are mapped again
+    (cycle walking), on average it takes less than four applications of network.
+
+    :param int size: length of permutation
+    :param RandomState random_state: generator of keys
+    :param int n_rounds: number of rounds in Feistel network
+    """
+    def __init__(self, size, random_state, n_rounds=4):
+        self.size = size
+        self.half_bits = max(1, (int(size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+        self.keys = [int(key) for key in random_state.randint(0, 2 ** 31, size=n_rounds)]
+
+    def _round_function(self, value, key):
+        value = (value * 0x9E3779B97F4A7C15 + key) & 0xFFFFFFFFFFFFFFFF
+        value ^= value >> 29
+        value = (value * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        value ^= value >> 32
+        return value & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round_function(right, key)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, index):
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+def _unravel_index(flat_index, dimensions):
+    """
+    :return: tuple, indices along each dimension of grid for index in flattened grid
+    """
+    indices = []
+    for size in reversed(dimensions):
+        flat_index, index = divmod(flat_index, size)
+        indices.append(index)
+    return tuple(reversed(indices))
+
+
+def _squared_distances(X1, X2):
+    distances = numpy.sum(X1 ** 2, axis=1)[:, numpy.newaxis] + numpy.sum(X2 ** 2, axis=1)[numpy.newaxis, :]
+    return numpy.clip(distances - 2 * X1.dot(X2.T), 0, None)
+
+
+def _predict_gaussian_process(X, y, candidates, length_scales, noise):
+    """
+    Fits gaussian process with RBF kernel and computes its predictions for all candidates at once.
+    Length scale of kernel is chosen among passed by marginal likelihood.
+
+    :param X: array of shape [n_points, n_parameters], points with known scores
+    :param y: scores in these points
+    :param candidates: array of shape [n_candidates, n_parameters]
+    :return: mean and std of predictions for candidates
+    """
+    y_mean, y_std = numpy.mean(y), numpy.std(y) + 1e-10
+    y = (y - y_mean) / y_std
+    distances = _squared_distances(X, X)
+    best = None
+    for length_scale in length_scales:
+        kernel = numpy.exp(-0.5 * distances / length_scale ** 2) + noise * numpy.eye(len(X))
+        cholesky = numpy.linalg.cholesky(kernel)
+        alpha = cho_solve((cholesky, True), y)
+        log_likelihood = -0.5 * y.dot(alpha) - numpy.sum(numpy.log(numpy.diag(cholesky)))
+        if best is None or log_likelihood > best[0]:
+            best = log_likelihood, length_scale, cholesky, alpha
+    _, length_scale, cholesky, alpha = best
+
+    cross_kernel = numpy.exp(-0.5 * _squared_distances(candidates, X) / length_scale ** 2)
+    mean = cross_kernel.dot(alpha)
+    v = solve_triangular(cholesky, cross_kernel.T, lower=True)
+    variance = numpy.clip(1. - numpy.sum(v ** 2, axis=0), 1e-10, None)
+    return mean * y_std + y_mean, numpy.sqrt(variance) * y_std
+
+
+def _get_pareto_front(points):
+    """
+    :param points: list of tuples (parameters, objectives), objectives is dict with score and costs
+    :return: points, for which there is no other point with better score and lower costs,
+        ordered by decreasing score
+    """
+    if len(points) == 0:
+        return []
+    cost_names = [name for name in points[0][1] if name != 'score']
+    # all objectives are minimized
+    objectives = numpy.array([[-point_objectives['score']] + [point_objectives[name] for name in cost_names]
+                              for _, point_objectives in points], dtype=float)
+    dominated = numpy.zeros(len(points), dtype=bool)
+    for row in objectives:
+        dominated |= numpy.all(row <= objectives, axis=1) & numpy.any(row < objectives, axis=1)
+    front = [point for point, is_dominated in zip(points, dominated) if not is_dominated]
+    return sorted(front, key=lambda point: -point[1]['score'])
+
+
 def _check_param_grid(param_grid):
     """ Checks parameters of grid """
     for key, v in param_grid.items():
@@ -384,15 +869,56 @@ def _translate_key_from_subgrid(subgrid_indices, key):
 # endregion
 
 
+class FoldingScore(float):
+    """
+    Quality computed by :class:`FoldingScorer`: float equal to mean quality over checked folds,
+    which also keeps qualities and costs of models for separate folds.
+
+    :param fold_scores: qualities on checked folds
+    :param fold_costs: costs of models trained on checked folds, list of dicts
+        ('train_time', 'predict_time' per event, 'model_size') or None
+    """
+    def __new__(cls, fold_scores, fold_costs=None):
+        fold_scores = numpy.array(fold_scores, dtype=float)
+        result = float.__new__(cls, numpy.mean(fold_scores))
+        result.fold_scores = fold_scores
+        result.fold_costs = fold_costs
+        return result
+
+    def __reduce__(self):
+        return FoldingScore, (self.fold_scores, self.fold_costs)
+
+    @property
+    def costs(self):
+        """Costs of model averaged over checked folds: dict name -> value (empty if costs were not measured)"""
+        if not self.fold_costs:
+            return OrderedDict()
+        return OrderedDict([(name, numpy.mean([costs[name] for costs in self.fold_costs]))
+                            for name in self.fold_costs[0]])
+
+    @property
+    def std(self):
+        """Standard deviation of quality over checked folds"""
+        return numpy.std(self.fold_scores)
+
+
 class FoldingScorer(object):
     """
     Scorer, which implements logic of data folding and scoring. This is a function-like object
 
+    Splits of data into folds are computed once for dataset and reused in all evaluations
+    (so data shouldn't be modified in place between evaluations).
+    Quality is returned as :class:`FoldingScore`, which contains qualities on separate folds
+    and measured costs of models: training time, prediction time per event and size of pickled model.
+
     Parameters:
     ----------
     :param int folds: 'k' used in k-folding while validating
     :param int fold_checks: not greater than folds, the number of checks we do by cross-validating
     :param function score_function: quality. if fold_checks > 1, the average is computed over checks.
+    :param parallel_profile: profile to train checked folds in parallel, i.e. 'threads-N'
+        (processes can't be used when scorer itself is run in pool of processes).
+    :type parallel_profile: None or str
 
     >>> def new_score_function(y_true, proba, sample_weight=None):
     >>>     '''
@@ -409,35 +935,163 @@ class FoldingScorer(object):
     0.5
     """
 
-    def __init__(self, score_function, folds=3, fold_checks=1):
+    def __init__(self, score_function, folds=3, fold_checks=1, parallel_profile=None):
         self.folds = folds
         self.fold_checks = fold_checks
         self.score_function = score_function
+        self.parallel_profile = parallel_profile
+
+    def _score(self, y_true, proba, sample_weight):
+        if sample_weight is not None:
+            return self.score_function(y_true, proba, sample_weight=sample_weight)
+        return self.score_function(y_true, proba)
+
+    def _map_folds(self, base_estimator, params, X, y, sample_weight, stage_values):
+        folds = _get_folds(X, y, sample_weight, self.folds, self.fold_checks)
+        n_folds = len(folds)
+        return map_on_cluster(self.parallel_profile, _score_fold, [self] * n_folds, [base_estimator] * n_folds,
+                              [params] * n_folds, folds, [stage_values] * n_folds)
 
     def __call__(self, base_estimator, params, X, y, sample_weight=None):
         """
-        :return float: quality
+        :return FoldingScore: quality
         """
-        k_folder = StratifiedKFold(y=y, n_folds=self.folds)
-        score = 0
-        for ind, (train_indices, test_indices) in enumerate(islice(k_folder, 0, self.fold_checks)):
-            classifier = clone(base_estimator)
-            classifier.set_params(**params)
+        results = list(self._map_folds(base_estimator, params, X, y, sample_weight, None))
+        return FoldingScore([score for score, _ in results], [costs for _, costs in results])
 
-            trainX, trainY = X.iloc[train_indices, :], y[train_indices]
-            testX, testY = X.iloc[test_indices, :], y[test_indices]
+    def staged_call(self, base_estimator, params, X, y, sample_weight=None, stage_param='n_estimators',
+                    stage_values=None):
+        """
+        Computes quality for several values of stage parameter (i.e. n_estimators) by one training:
+        estimator is trained with the largest value, qualities for others are computed with staged_predict_proba.
+        Training time and model size for smaller values are estimated proportionally to the number of stages.
 
-            if sample_weight is not None:
-                train_weights, test_weights = sample_weight[train_indices], sample_weight[test_indices]
-                classifier.fit(trainX, trainY, sample_weight=train_weights)
-                score += self.score_function(testY, classifier.predict_proba(testX), sample_weight=test_weights)
-            else:
-                classifier.fit(trainX, trainY)
-                score += self.score_function(testY, classifier.predict_proba(testX))
-        return score / self.fold_checks
+        :param str stage_param: name of parameter, which is the number of stages
+        :param list[int] stage_values: values of stage parameter to compute quality for
+        :return dict: value of stage parameter -> FoldingScore
+        """
+        stage_values = sorted(stage_values)
+        params = OrderedDict(params)
+        params[stage_param] = stage_values[-1]
+        results = list(self._map_folds(base_estimator, params, X, y, sample_weight, stage_values))
+        # scores: [n_folds, n_stage_values]
+        scores = numpy.array([fold_scores for fold_scores, _ in results])
+        return OrderedDict([(value, FoldingScore(scores[:, i], [fold_costs[i] for _, fold_costs in results]))
+                            for i, value in enumerate(stage_values)])
 
 
-def apply_scorer(scorer, params, base_estimator, X, y, sample_weight):
+# splits of datasets used by FoldingScorer: key -> (weak references to data, folds)
+_FOLDS_CACHE = OrderedDict()
+_FOLDS_CACHE_SIZE = 2
+# reentrant, since weak reference callback may be called by garbage collector while lock is held
+_FOLDS_CACHE_LOCK = threading.RLock()
+
+
+def _weak_reference(value, callback=None):
+    return weakref.ref(value, callback) if value is not None else (lambda: None)
+
+
+def _get_folds(X, y, sample_weight, n_folds, fold_checks):
+    """
+    Splits data into folds. Splits are computed once for dataset and reused while dataset is alive,
+    they are removed from cache as soon as dataset is deleted.
+
+    :return: list of tuples (train X, train y, train weights, test X, test y, test weights)
+    """
+    key = (id(X), id(y), id(sample_weight), len(X), n_folds, fold_checks)
+    with _FOLDS_CACHE_LOCK:
+        if key in _FOLDS_CACHE:
+            references, folds = _FOLDS_CACHE[key]
+            if all(reference() is value for reference, value in zip(references, [X, y, sample_weight])):
+                return folds
+
+    folds = []
+    for train_indices, test_indices in islice(StratifiedKFold(y=y, n_folds=n_folds), 0, fold_checks):
+        train_weights, test_weights = None, None
+        if sample_weight is not None:
+            train_weights, test_weights = sample_weight[train_indices], sample_weight[test_indices]
+        folds.append((X.iloc[train_indices, :], y[train_indices], train_weights,
+                      X.iloc[test_indices, :], y[test_indices], test_weights))
+
+    with _FOLDS_CACHE_LOCK:
+        _FOLDS_CACHE[key] = [_weak_reference(value, lambda reference: _forget_folds(key, reference))
+                             for value in [X, y, sample_weight]], folds
+        while len(_FOLDS_CACHE) > _FOLDS_CACHE_SIZE:
+            _FOLDS_CACHE.popitem(last=False)
+    return folds
+
+
+def _forget_folds(key, reference):
+    """ Removes splits of dataset, which was deleted """
+    with _FOLDS_CACHE_LOCK:
+        entry = _FOLDS_CACHE.get(key)
+        # id may be already reused by other dataset
+        if entry is not None and any(entry_reference is reference for entry_reference in entry[0]):
+            del _FOLDS_CACHE[key]
+
+
+def _has_staged_predictions(estimator):
+    """ Wrappers (like SklearnClassifier) provide staged predictions only if wrapped classifier does """
+    if not hasattr(estimator, 'staged_predict_proba'):
+        return False
+    return not hasattr(estimator, 'clf') or hasattr(estimator.clf, 'staged_predict_proba')
+
+
+def _get_model_size(classifier):
+    try:
+        return len(cPickle.dumps(classifier, protocol=2))
+    except Exception:
+        # some estimators can't be pickled
+        return numpy.nan
+
+
+def _score_fold(scorer, base_estimator, params, fold, stage_values):
+    """
+    Supplementary function.
+    Trains classifier on fold and computes quality and costs of model
+    (lists of qualities and costs for stage_values if they are passed)
+    """
+    trainX, trainY, train_weights, testX, testY, test_weights = fold
+    classifier = clone(base_estimator)
+    classifier.set_params(**params)
+    start = default_timer()
+    if train_weights is not None:
+        classifier.fit(trainX, trainY, sample_weight=train_weights)
+    else:
+        classifier.fit(trainX, trainY)
+    train_time = default_timer() - start
+    model_size = _get_model_size(classifier)
+    if stage_values is None:
+        start = default_timer()
+        proba = classifier.predict_proba(testX)
+        predict_time = default_timer() - start
+        costs = OrderedDict(zip(_COST_NAMES, [train_time, predict_time / len(testX), model_size]))
+        return scorer._score(testY, proba, test_weights), costs
+
+    scores = []
+    # number of stages and prediction time for each score
+    measurements = []
+    proba = None
+    stage = 0
+    predict_time = 0.
+    start = default_timer()
+    for stage, proba in enumerate(classifier.staged_predict_proba(testX), 1):
+        predict_time += default_timer() - start
+        while len(scores) < len(stage_values) and stage_values[len(scores)] <= stage:
+            scores.append(scorer._score(testY, proba, test_weights))
+            measurements.append((stage, predict_time))
+        start = default_timer()
+    # after early stopping predictions for larger number of stages coincide with the last one
+    while len(scores) < len(stage_values):
+        scores.append(scorer._score(testY, proba, test_weights))
+        measurements.append((stage, predict_time))
+    n_stages = max(stage, 1)
+    costs = [OrderedDict(zip(_COST_NAMES, [train_time * n / n_stages, time / len(testX), model_size * n / n_stages]))
+             for n, time in measurements]
+    return scores, costs
+
+
+def apply_scorer(scorer, params, base_estimator, X, y, sample_weight, stage_param=None, stage_values=None):
     """
     Application of scorer algorithm.
 
@@ -448,11 +1102,21 @@ def apply_scorer(scorer, params, base_estimator, X, y, sample_weight):
     :param y: labels of events - array-like of shape [n_samples]
     :param sample_weight: weight of events,
            array-like of shape [n_samples] or None if all weights are equal
-
-    :return: ('success', float) or ('fail', Exception), float will contain result.
+    :param stage_param: name of parameter, which is the number of stages
+    :type stage_param: None or str
+    :param stage_values: if not None, qualities for all these values of stage parameter
+        are computed by `scorer.staged_call`
+    :type stage_values: None or list[int]
+
+    :return: ('success', float) or ('fail', Exception), float will contain result
+        (dict with quality for each value of stage parameter if stage_values are passed).
     """
     try:
         estimator = clone(base_estimator)
+        if stage_values is not None:
+            return 'success', scorer.staged_call(params=params, base_estimator=estimator, X=X, y=y,
+                                                 sample_weight=sample_weight, stage_param=stage_param,
+                                                 stage_values=stage_values)
         return 'success', scorer(params=params, base_estimator=estimator, X=X, y=y, sample_weight=sample_weight)
     except Exception as e:
         return 'fail', e
@@ -472,20 +1136,40 @@ class GridOptimalSearchCV(object):
     :param AbstractParameterGenerator params_generator: generator of grid search algorithm
     :param object scorer: which implement method __call__ with kwargs:
         "base_estimator", "params", "X", "y", "sample_weight"
-    :param parallel_profile: name of profile
+    :param parallel_profile: name of IPython profile, 'threads-N' or 'processes-N' to use N threads
+        or processes on this machine (data is shared with processes via memory), None to compute sequentially.
     :type parallel_profile: None or str
+    :param stage_param: name of parameter in grid, which is the number of stages (i.e. 'n_estimators').
+        If scorer has `staged_call` method (like FoldingScorer) and estimator has `staged_predict_proba`,
+        points differing only in value of this parameter are evaluated by one training with staged predictions,
+        all of them are recorded in `grid_scores_`.
+    :type stage_param: None or str
+    :param checkpoint_path: path to SQLite database, where result of each evaluation is saved.
+        Results are identified by fingerprint of data, estimator, scorer and parameters, so restarted search
+        (or search over overlapping grid) takes finished evaluations from database instead of retraining.
+        Estimator and scorer should be picklable.
+    :type checkpoint_path: None or str
 
     Attributes
     ----------
     generator: return grid generator
+    objectives_: dict with objectives for each evaluated point: score and costs of model
+        (if they are measured by scorer, like in FoldingScorer)
+    pareto_front_: points with objectives, for which there is no other point with better score and lower costs
     """
 
-    def __init__(self, estimator, params_generator, scorer, parallel_profile=None):
+    def __init__(self, estimator, params_generator, scorer, parallel_profile=None, stage_param=None,
+                 checkpoint_path=None):
         self.base_estimator = estimator
         self.params_generator = params_generator
         self.scorer = scorer
         self.parallel_profile = parallel_profile
+        self.stage_param = stage_param
+        self.checkpoint_path = checkpoint_path
         self.evaluations_done = 0
+        self.objectives_ = OrderedDict()
+        self._points_params = OrderedDict()
+        self._checkpoint = None
 
     def _log(self, msg, level=20):
         logger = logging.getLogger(__name__)
@@ -512,6 +1196,145 @@ class GridOptimalSearchCV(object):
         best_estimator_.fit(X, y, sample_weight=sample_weight)
         return best_estimator_
 
+    @property
+    def pareto_front_(self):
+        """
+        Property, return list of tuples (parameters, objectives) for points on pareto front
+        ordered by decreasing score, objectives is dict with score and costs
+        """
+        return _get_pareto_front([(self._points_params[key], objectives)
+                                  for key, objectives in self.objectives_.items()])
+
+    def _is_stageable(self, state_indices):
+        generator = self.params_generator
+        if self.stage_param is None or self.stage_param not in generator.param_grid \
+                or not hasattr(self.scorer, 'staged_call'):
+            return False
+        # estimators without staged predictions are evaluated as usual
+        if not _has_staged_predictions(self.base_estimator):
+            return False
+        if getattr(generator, 'budget_param', None) == self.stage_param:
+            return False
+        # points with special keys (i.e. from subgrid) are evaluated as usual
+        return isinstance(state_indices, tuple) and len(state_indices) == len(generator.dimensions) and \
+            all(isinstance(index, numbers.Integral) for index in state_indices)
+
+    def _next_evaluation(self):
+        """
+        Generates next point. If stage parameter is used, points differing only in value of this parameter,
+        which were not queued before, are evaluated together by one training.
+
+        :return: keys of points, dict with parameters for training, values of stage parameter (or None);
+            None if generator waits for results of evaluated points
+        """
+        point = self.params_generator.generate_next_point()
+        if point is None:
+            return None
+        state_indices, state_dict = point
+        if not self._is_stageable(state_indices):
+            return [state_indices], state_dict, None
+        axis = list(self.params_generator.param_grid).index(self.stage_param)
+        values = self.params_generator.param_grid[self.stage_param]
+        keys = [state_indices]
+        for index in range(len(values)):
+            key = state_indices[:axis] + (index,) + state_indices[axis + 1:]
+            if key not in self.params_generator.queued_tasks_:
+                self.params_generator.queued_tasks_.add(key)
+                keys.append(key)
+        stage_values = [values[key[axis]] for key in keys]
+        state_dict = OrderedDict(state_dict)
+        state_dict[self.stage_param] = max(stage_values)
+        return keys, state_dict, stage_values
+
+    def _get_points_params(self, state_dict, stage_values):
+        """
+        :return: list with parameters of each point evaluated by one training
+        """
+        if stage_values is None:
+            return [state_dict]
+        return [dict(state_dict, **{self.stage_param: value}) for value in stage_values]
+
+    def _get_saved_result(self, state_dict, stage_values):
+        """
+        :return: ('success', score) if results for all points are saved in checkpoint, None otherwise
+        """
+        if self._checkpoint is None:
+            return None
+        scores = [self._checkpoint.get(params) for params in self._get_points_params(state_dict, stage_values)]
+        if any(score is None for score in scores):
+            return None
+        if stage_values is None:
+            return 'success', scores[0]
+        return 'success', dict(zip(stage_values, scores))
+
+    def _record_results(self, keys, state_dict, stage_values, status, score):
+        # for staged evaluation stage parameter is printed for each point separately
+        params = ", ".join([k + '=' + str(v) for k, v in state_dict.items()
+                            if stage_values is None or k != self.stage_param])
+        if status != 'success':
+            if stage_values is not None:
+                params += ', {}={}'.format(self.stage_param, stage_values)
+            message = 'Fail during training on the node \nException {exc}\n Parameters {params}'
+            self._log(message.format(exc=score, params=params), level=40)
+        else:
+            scores = [score] if stage_values is None else [score[value] for value in stage_values]
+            for key, point_params, point_score in zip(keys, self._get_points_params(state_dict, stage_values),
+                                                      scores):
+                self.params_generator.add_result(key, point_score)
+                self.objectives_[key] = OrderedDict([('score', point_score)] +
+                                                    list(getattr(point_score, 'costs', {}).items()))
+                self._points_params[key] = point_params
+                if self._checkpoint is not None:
+                    self._checkpoint.put(point_params, point_score)
+                if stage_values is None:
+                    self._log("{}: {}".format(point_score, params))
+                else:
+                    self._log("{}: {}, {}={}".format(point_score, params, self.stage_param,
+                                                     point_params[self.stage_param]))
+        self.evaluations_done += len(keys)
+
+    def _fit_asynchronously(self, n_workers, submit):
+        """
+        Evaluates points keeping all workers busy: as soon as some evaluation is finished,
+        its result is passed to generator and the next point is generated and submitted.
+
+        :param int n_workers: max number of points evaluated simultaneously
+        :param submit: function, which takes dict with parameters and values of stage parameter and
+            returns AsyncResult for evaluation of this point
+        """
+        if not self.params_generator.supports_batch and n_workers > 1:
+            self._log("{} doesn't support parallel evaluations, points are evaluated one by one"
+                      .format(type(self.params_generator).__name__), level=30)
+            n_workers = 1
+        in_flight = []
+        n_submitted = self.evaluations_done
+        while self.evaluations_done < self.params_generator.n_evaluations:
+            while len(in_flight) < n_workers and n_submitted < self.params_generator.n_evaluations:
+                evaluation = self._next_evaluation()
+                if evaluation is None:
+                    if len(in_flight) == 0:
+                        raise RuntimeError("The grid is exhausted, cannot generate more points")
+                    # next point is generated after some evaluation is finished
+                    break
+                keys, state_dict, stage_values = evaluation
+                saved_result = self._get_saved_result(state_dict, stage_values)
+                if saved_result is not None:
+                    async_result = _ComputedResult(saved_result)
+                else:
+                    async_result = submit(state_dict, stage_values)
+                in_flight.append((keys, state_dict, stage_values, async_result))
+                n_submitted += len(keys)
+            finished = [task for task in in_flight if task[-1].ready()]
+            if len(finished) == 0:
+                in_flight[0][-1].wait(_POLLING_INTERVAL)
+                continue
+            for task in finished:
+                in_flight.remove(task)
+                keys, state_dict, stage_values, async_result = task
+                status, score = async_result.get()
+                self._record_results(keys, state_dict, stage_values, status, score)
+            print("%i evaluations done" % self.evaluations_done)
+
     def fit(self, X, y, sample_weight=None):
         """
         Run fit with all sets of parameters.
@@ -524,35 +1347,98 @@ class GridOptimalSearchCV(object):
         """
         X, y, sample_weight = check_inputs(X, y, sample_weight=sample_weight, allow_none_weights=True)
 
+        if self.checkpoint_path is not None:
+            self._checkpoint = _SearchCheckpoint(self.checkpoint_path, get_fingerprint(
+                X, y, sample_weight, self.base_estimator, self.scorer))
+        try:
+            self._fit(X, y, sample_weight)
+        finally:
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+                self._checkpoint = None
+        return self
+
+    def _fit(self, X, y, sample_weight):
         if self.parallel_profile is None:
             while self.evaluations_done < self.params_generator.n_evaluations:
-                state_indices, state_dict = self.params_generator.generate_next_point()
-                status, value = apply_scorer(self.scorer, state_dict, self.base_estimator, X, y, sample_weight)
+                evaluation = self._next_evaluation()
+                if evaluation is None:
+                    raise RuntimeError("The grid is exhausted, cannot generate more points")
+                keys, state_dict, stage_values = evaluation
+                result = self._get_saved_result(state_dict, stage_values)
+                if result is None:
+                    result = apply_scorer(self.scorer, state_dict, self.base_estimator, X, y, sample_weight,
+                                          self.stage_param, stage_values)
+                status, value = result
                 assert status == 'success', 'Error during grid search ' + str(value)
-                self.params_generator.add_result(state_indices, value)
-                self.evaluations_done += 1
-                state_string = ", ".join([k + '=' + str(v) for k, v in state_dict.items()])
-                self._log('{}: {}'.format(value, state_string))
+                self._record_results(keys, state_dict, stage_values, status, value)
+        elif is_local_profile(self.parallel_profile):
+            pool = LocalPool(self.parallel_profile)
+            try:
+                # data is written to shared memory once and used by all evaluations
+                self._fit_asynchronously(pool.n_workers, lambda state_dict, stage_values: pool.apply_async(
+                    apply_scorer, self.scorer, state_dict, self.base_estimator, X, y, sample_weight,
+                    self.stage_param, stage_values))
+            finally:
+                pool.close()
         else:
             from IPython.parallel import Client
 
-            direct_view = Client(profile=self.parallel_profile).direct_view()
-            portion = len(direct_view)
-            print("There are {0} cores in cluster, the portion is equal {1}".format(len(direct_view), portion))
-            while self.evaluations_done < self.params_generator.n_evaluations:
-                state_indices_array, state_dict_array = self.params_generator.generate_batch_points(size=portion)
-                result = direct_view.map_sync(apply_scorer, [self.scorer] * portion, state_dict_array,
-                                              [self.base_estimator] * portion,
-                                              [X] * portion, [y] * portion, [sample_weight] * portion)
-                assert len(result) == portion, "The length of result is very strange"
-                for state_indices, state_dict, (status, score) in zip(state_indices_array, state_dict_array, result):
-                    params = ", ".join([k + '=' + str(v) for k, v in state_dict.items()])
-                    if status != 'success':
-                        message = 'Fail during training on the node \nException {exc}\n Parameters {params}'
-                        self._log(message.format(exc=score, params=params), level=40)
-                    else:
-                        self.params_generator.add_result(state_indices, score)
-                        self._log("{}: {}".format(score, params))
-                self.evaluations_done += portion
-                print("%i evaluations done" % self.evaluations_done)
-        return self
\ No newline at end of file
+            client = Client(profile=self.parallel_profile)
+            n_engines = len(client.ids)
+            print("There are {0} cores in cluster".format(n_engines))
+            # data is sent to engines only once during the whole search
+            data = [broadcast(client, self.parallel_profile, value) for value in [X, y, sample_weight]]
+            view = client.load_balanced_view()
+            self._fit_asynchronously(n_engines, lambda state_dict, stage_values: view.apply_async(
+                apply_scorer, self.scorer, state_dict, self.base_estimator, data[0], data[1], data[2],
+                self.stage_param, stage_values))
+
+
+class _ComputedResult(object):
+    """ Result of evaluation, which is already known, with the same interface as AsyncResult """
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def wait(self, timeout=None):
+        pass
+
+    def get(self):
+        return self.value
+
+
+class _SearchCheckpoint(object):
+    """
+    SQLite database with results of grid search. Each result is committed immediately.
+
+    :param str path: path to database file
+    :param str search_fingerprint: fingerprint of data, estimator and scorer
+    """
+    def __init__(self, path, search_fingerprint):
+        self.search_fingerprint = search_fingerprint
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, score BLOB)')
+        self._connection.commit()
+
+    def _get_key(self, params):
+        return get_fingerprint(self.search_fingerprint, sorted(params.items()))
+
+    def get(self, params):
+        """
+        :return: saved score for parameters or None
+        """
+        row = self._connection.execute('SELECT score FROM results WHERE key = ?', (self._get_key(params),)).fetchone()
+        if row is None:
+            return None
+        return cPickle.loads(bytes(row[0]))
+
+    def put(self, params, score):
+        self._connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?)',
+                                 (self._get_key(params), sqlite3.Binary(cPickle.dumps(score, protocol=2))))
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
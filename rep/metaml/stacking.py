@@ -3,9 +3,17 @@ This module contains stacking strategies (meta-algorithms of machine learning).
 """
 from __future__ import division, print_function, absolute_import
 
+from collections import OrderedDict
+import itertools
+
 import numpy
+import pandas
 from sklearn.base import clone
+from sklearn.cross_validation import KFold
+from six.moves import zip
 
+from . import utils
+from .factory import train_estimator
 from ..estimators import Classifier
 from ..estimators.utils import check_inputs, _get_features
 
@@ -20,17 +28,23 @@ class FeatureSplitter(Classifier):
 
     When building predictions, classifier predicts the events with
     the same value of `split_feature` it was trained on.
+    Events are grouped by value of `split_feature` with one sort,
+    predictions of all classifiers are written to result at once.
 
     :param str split_feature: the name of key feature,
     :param base_estimator: the classifier, its' copies are trained on parts of dataset
     :param list[str] features: list of columns classifier uses
+    :param parallel_profile: profile to train classifiers and compute their predictions in parallel
+        (IPython profile, 'threads-N' or 'processes-N'), None to compute sequentially
+    :type parallel_profile: None or str
 
     .. note:: `split_feature` must be in list of `features`
     """
-    def __init__(self, split_feature, base_estimator, train_features=None):
+    def __init__(self, split_feature, base_estimator, train_features=None, parallel_profile=None):
         self.base_estimator = base_estimator
         self.split_feature = split_feature
         self.train_features = train_features
+        self.parallel_profile = parallel_profile
         Classifier.__init__(self, features=self._features())
 
     def _features(self):
@@ -68,15 +82,18 @@ class FeatureSplitter(Classifier):
         # TODO cover the case of missing labels in subsets.
         split_column_values, X = self._get_features(X)
         self._set_classes(y)
+        values, _, groups_rows = _group_rows(split_column_values)
+        n_groups = len(values)
+        # the same data is passed for all groups, rows of group are selected by the worker just before training
+        result = utils.map_on_cluster(self.parallel_profile, _train_group, values,
+                                      [clone(self.base_estimator) for _ in range(n_groups)],
+                                      [X] * n_groups, [y] * n_groups, [sample_weight] * n_groups, groups_rows)
         self.base_estimators = {}
-        for value in numpy.unique(split_column_values):
-            rows = numpy.array(split_column_values) == value
-            base_classifier = clone(self.base_estimator)
-            if sample_weight is None:
-                base_classifier.fit(X.iloc[rows, :], y[rows])
-            else:
-                base_classifier.fit(X.iloc[rows, :], y[rows], sample_weight=sample_weight[rows])
-            self.base_estimators[value] = base_classifier
+        for status, data in result:
+            if status != 'success':
+                raise RuntimeError('Problem while training on the node, report:\n{}'.format(data))
+            value, estimator, spent_time = data
+            self.base_estimators[value] = estimator
         return self
 
     def predict_proba(self, X):
@@ -88,11 +105,17 @@ class FeatureSplitter(Classifier):
         :return: probabilities of shape [n_samples, n_classes]
         """
         split_column_values, X = self._get_features(X)
-        result = numpy.zeros([len(X), self.n_classes_])
-        for value, estimator in self.base_estimators.items():
-            mask = split_column_values == value
-            result[mask, :] = estimator.predict_proba(X.loc[mask, :])
-        return result
+        values, order, groups_rows = _group_rows(split_column_values)
+        known = [(self.base_estimators[value], rows) for value, rows in zip(values, groups_rows)
+                 if value in self.base_estimators]
+        predictions = iter(utils.map_on_cluster(self.parallel_profile, _predict_group,
+                                                [estimator for estimator, _ in known], [X] * len(known),
+                                                [rows for _, rows in known]))
+        # events with values of split_feature not present in training get zero probabilities
+        groups_predictions = [next(predictions) if value in self.base_estimators
+                              else numpy.zeros([len(rows), self.n_classes_])
+                              for value, rows in zip(values, groups_rows)]
+        return _scatter_groups(order, groups_predictions, self.n_classes_)
 
     def staged_predict_proba(self, X):
         """
@@ -104,16 +127,217 @@ class FeatureSplitter(Classifier):
         :return: iterable sequence of numpy.arrays of shape [n_samples, n_classes]
         """
         split_column_values, X = self._get_features(X)
-        result = numpy.zeros([len(X), self.n_classes_])
-        masks_iterators = []
-        for value, estimator in self.base_estimators.items():
-            mask = split_column_values == value
-            prediction_iterator = estimator.staged_predict_proba(X.loc[mask, :])
-            masks_iterators.append([mask, prediction_iterator])
-        try:
-            while True:
-                for mask, prediction_iterator in masks_iterators:
-                    result[mask, :] = next(prediction_iterator)
-                yield result
-        except StopIteration:
-            pass
+        values, order, groups_rows = _group_rows(split_column_values)
+        iterators = []
+        for value, rows in zip(values, groups_rows):
+            if value in self.base_estimators:
+                iterators.append(self.base_estimators[value].staged_predict_proba(X.iloc[rows, :]))
+            else:
+                iterators.append(itertools.repeat(numpy.zeros([len(rows), self.n_classes_])))
+        # iteration stops when the classifier with the smallest number of stages is exhausted
+        for groups_predictions in zip(*iterators):
+            yield _scatter_groups(order, groups_predictions, self.n_classes_)
+
+
+class StackingClassifier(Classifier):
+    """
+    Two-level ensemble: base classifiers are trained on k-folds of data,
+    meta-classifier is trained on their out-of-fold predictions.
+    To predict new events, base classifiers trained on the whole dataset are used.
+
+    Trainings of all base classifiers (on folds and on the whole dataset) are done in parallel,
+    out-of-fold predictions are written to matrix of meta-features as soon as they are computed.
+
+    Meta-features are probabilities predicted by base classifiers (without probability of class 0,
+    which is determined by others), named as '<name>_<class>'.
+
+    :param base_estimators: base classifiers, dict name -> classifier (i.e. :class:`ClassifiersFactory`)
+    :param meta_estimator: classifier trained on predictions of base classifiers
+    :param int n_folds: number of folds used to compute out-of-fold predictions
+    :param random_state: random state for splitting data into folds
+    :type random_state: None or int or RandomState
+    :param features: features used by base classifiers
+    :type features: None or list[str]
+    :param parallel_profile: profile to train base classifiers and compute their predictions in parallel
+        (IPython profile, 'threads-N' or 'processes-N'), None to compute sequentially
+    :type parallel_profile: None or str
+
+    Attributes:
+    -----------
+    estimators: OrderedDict name -> base classifier trained on the whole dataset
+    meta_classifier: trained meta-classifier
+    """
+    def __init__(self, base_estimators, meta_estimator, n_folds=3, random_state=None, features=None,
+                 parallel_profile=None):
+        self.base_estimators = base_estimators
+        self.meta_estimator = meta_estimator
+        self.n_folds = n_folds
+        self.random_state = random_state
+        self.parallel_profile = parallel_profile
+        Classifier.__init__(self, features=features)
+
+    def _get_meta_features_names(self):
+        return ['{}_{}'.format(name, label) for name in self.estimators for label in range(1, self.n_classes_)]
+
+    def _get_folds_rows(self, n_samples):
+        """
+        :return: list with indices of events for each fold
+        """
+        return [numpy.sort(fold_indices) for _, fold_indices in
+                KFold(n_samples, self.n_folds, shuffle=True, random_state=self.random_state)]
+
+    def fit(self, X, y, sample_weight=None):
+        """
+        Train base classifiers on folds and meta-classifier on their out-of-fold predictions.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features] with features
+        :param y: array-like of shape [n_samples] with targets
+        :param sample_weight: array-like of shape [n_samples] with events weights or None.
+
+        :return: self
+        """
+        X, y, sample_weight = check_inputs(X, y, sample_weight=sample_weight, allow_none_weights=True)
+        X = self._get_features(X)
+        self._set_classes(y)
+        names = list(self.base_estimators)
+        folds_rows = self._get_folds_rows(len(X))
+        folds_column = numpy.zeros(len(X), dtype=int)
+        for fold, rows in enumerate(folds_rows):
+            folds_column[rows] = fold
+
+        # each base classifier is trained on all folds except one for each fold and on the whole dataset (fold -1)
+        tasks = [(index, fold) for index in range(len(names)) for fold in range(-1, len(folds_rows))]
+        n_tasks = len(tasks)
+        n_columns = self.n_classes_ - 1
+        meta_features = numpy.zeros([len(X), len(names) * n_columns])
+        estimators = {}
+        # the same data is passed for all tasks, training subset is selected by the worker
+        for status, data in utils.imap_on_cluster(self.parallel_profile, _train_stacking_task, tasks,
+                                                  [clone(self.base_estimators[names[index]]) for index, _ in tasks],
+                                                  [X] * n_tasks, [y] * n_tasks, [sample_weight] * n_tasks,
+                                                  [folds_column] * n_tasks):
+            if status != 'success':
+                raise RuntimeError('Problem while training on the node, report:\n{}'.format(data))
+            (index, fold), estimator, proba = data
+            if fold < 0:
+                estimators[index] = estimator
+            else:
+                meta_features[folds_rows[fold], index * n_columns:(index + 1) * n_columns] = proba[:, 1:]
+        self.estimators = OrderedDict([(name, estimators[index]) for index, name in enumerate(names)])
+
+        meta_features = pandas.DataFrame(meta_features, columns=self._get_meta_features_names())
+        self.meta_classifier = clone(self.meta_estimator)
+        if sample_weight is None:
+            self.meta_classifier.fit(meta_features, y)
+        else:
+            self.meta_classifier.fit(meta_features, y, sample_weight=sample_weight)
+        return self
+
+    def _get_meta_features(self, X):
+        """
+        :param pandas.DataFrame X: data of shape [n_samples, n_features]
+        :return: pandas.DataFrame with predictions of base classifiers
+        """
+        X = self._get_features(X)
+        n_estimators = len(self.estimators)
+        n_columns = self.n_classes_ - 1
+        meta_features = numpy.zeros([len(X), n_estimators * n_columns])
+        predictions = utils.map_on_cluster(self.parallel_profile, _predict_proba,
+                                           list(self.estimators.values()), [X] * n_estimators)
+        for index, proba in enumerate(predictions):
+            meta_features[:, index * n_columns:(index + 1) * n_columns] = proba[:, 1:]
+        return pandas.DataFrame(meta_features, columns=self._get_meta_features_names())
+
+    def predict_proba(self, X):
+        """
+        Predict probabilities: base classifiers are evaluated in parallel, their predictions are passed
+        to meta-classifier.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :return: probabilities of shape [n_samples, n_classes]
+        """
+        return self.meta_classifier.predict_proba(self._get_meta_features(X))
+
+    def staged_predict_proba(self, X):
+        """
+        Predict probabilities after each stage of meta-classifier.
+
+        :param X: pandas.DataFrame of shape [n_samples, n_features]
+        :return: iterable sequence of numpy.arrays of shape [n_samples, n_classes]
+        """
+        return self.meta_classifier.staged_predict_proba(self._get_meta_features(X))
+
+
+def _group_rows(split_column_values):
+    """
+    Groups events by value of split feature using one sort.
+
+    :return: sorted unique values, permutation of events ordering them by value, list with events of each value
+    """
+    split_column_values = numpy.asarray(split_column_values)
+    order = numpy.argsort(split_column_values, kind='mergesort')
+    sorted_values = split_column_values[order]
+    # group starts where value differs from previous one
+    is_start = numpy.ones(len(sorted_values), dtype=bool)
+    is_start[1:] = sorted_values[1:] != sorted_values[:-1]
+    starts = numpy.flatnonzero(is_start)
+    return sorted_values[starts], order, numpy.split(order, starts[1:])
+
+
+def _scatter_groups(order, groups_predictions, n_classes):
+    """
+    Writes predictions computed for groups of events to their positions in result at once.
+
+    :param order: permutation of events, which groups them (see :func:`_group_rows`)
+    :param groups_predictions: list with predictions of shape [n_group_events, n_classes] for each group
+    """
+    result = numpy.zeros([len(order), n_classes])
+    if len(groups_predictions) > 0:
+        result[order] = numpy.concatenate(groups_predictions)
+    return result
+
+
+def _train_group(value, estimator, X, y, sample_weight, rows):
+    """
+    Supplementary function.
+    Trains estimator on events of one group.
+
+    :param rows: indices of events with given value of split feature
+    :return: the same as :func:`train_estimator`
+    """
+    if sample_weight is not None:
+        sample_weight = sample_weight[rows]
+    return train_estimator(value, estimator, X.iloc[rows, :], y[rows], sample_weight)
+
+
+def _predict_group(estimator, X, rows):
+    """ Supplementary function. Predicts probabilities for events of one group """
+    return estimator.predict_proba(X.iloc[rows, :])
+
+
+def _train_stacking_task(task, estimator, X, y, sample_weight, folds_column):
+    """
+    Supplementary function.
+    Trains estimator on all folds except given one and predicts events of this fold.
+
+    :param task: (index of base classifier, fold), fold -1 means training on the whole dataset
+    :param folds_column: numpy.array of shape [n_samples] with index of fold for each event
+    :return: ('success', (task, estimator trained on the whole dataset or None, out-of-fold predictions or None))
+        or ('fail', report), see :func:`train_estimator`
+    """
+    _, fold = task
+    train_mask = folds_column != fold
+    if sample_weight is not None:
+        sample_weight = sample_weight[train_mask]
+    status, data = train_estimator(task, estimator, X.iloc[train_mask, :], y[train_mask], sample_weight)
+    if status != 'success':
+        return status, data
+    _, estimator, _ = data
+    if fold < 0:
+        return status, (task, estimator, None)
+    return status, (task, None, estimator.predict_proba(X.iloc[~train_mask, :]))
+
+
+def _predict_proba(estimator, X):
+    """ Supplementary function. Predicts probabilities by estimator """
+    return estimator.predict_proba(X)
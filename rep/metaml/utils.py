@@ -1,8 +1,32 @@
-from multiprocessing.pool import ThreadPool
+from multiprocessing.pool import ThreadPool, Pool
+from abc import ABCMeta, abstractmethod
+from collections import Counter, OrderedDict, deque
 import itertools
+import logging
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy
+import pandas
+from six.moves import map as imap
+
+from ..utils import get_fingerprint
 
 __author__ = 'Alex Rogozhnikov, Tatiana Likhomanenko'
 
+# folder for data shared with worker processes, files in /dev/shm are kept in memory
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+# arrays smaller than this number of bytes are passed to worker processes (and IPython engines) as usual
+SHARING_MIN_BYTES = 2 ** 20
+
+# objects pushed to IPython engines: (profile, id) -> (weak reference, fingerprint, name on engines)
+_BROADCASTED = {}
+_BROADCAST_COUNTER = itertools.count()
+# number of rows used to check whether broadcasted object was changed
+_SIGNATURE_ROWS = 1000
+
 
 def _threads_wrapper(func_and_args):
     func = func_and_args[0]
@@ -10,11 +34,21 @@ def _threads_wrapper(func_and_args):
     return func(*args)
 
 
+def _processes_wrapper(func_and_args):
+    func = func_and_args[0]
+    args = [arg.attach() if isinstance(arg, _SharedHandle) else arg for arg in func_and_args[1:]]
+    return func(*args)
+
+
 def map_on_cluster(parallel_profile, *args, **kw_args):
     """
     The same as map, but the first argument is ipc_profile. Distributes the task over IPython cluster.
 
-    :param parallel_profile: the IPython cluster profile to use.
+    :param parallel_profile: the IPython cluster profile to use,
+        'threads-N' to use N threads, 'processes-N' to use N processes on this machine.
+        Large arrays and data frames are passed to processes through shared memory.
+        On IPython cluster large arrays and data frames used in several tasks are sent to each engine once
+        (see :func:`broadcast_arguments`).
     :type parallel_profile: None or str
     :param list args: function, arguments
     :param dict kw_args: kwargs for LoadBalacedView.map_sync
@@ -23,12 +57,459 @@ def map_on_cluster(parallel_profile, *args, **kw_args):
     """
     if parallel_profile is None:
         return map(*args)
-    elif str.startswith(parallel_profile, 'threads-'):
-        n_threads = int(parallel_profile[len('threads-'):])
-        pool = ThreadPool(processes=n_threads)
+    elif is_local_profile(parallel_profile):
+        pool = LocalPool(parallel_profile)
+        try:
+            return pool.map(*args)
+        finally:
+            pool.close()
+    else:
+        from IPython.parallel import Client
+
+        client = Client(profile=parallel_profile)
         func, params = args[0], args[1:]
-        return pool.map(_threads_wrapper, zip(itertools.cycle([func]), *params))
+        params = broadcast_arguments(client, parallel_profile, params)
+        return client.load_balanced_view().map_sync(func, *params, **kw_args)
+
+
+def imap_on_cluster(parallel_profile, *args):
+    """
+    The same as :func:`map_on_cluster`, but returns iterator over results, which are yielded as soon
+    as computed, so the order of results may differ from the order of arguments.
+
+    :param parallel_profile: the IPython cluster profile to use,
+        'threads-N' to use N threads, 'processes-N' to use N processes on this machine.
+    :type parallel_profile: None or str
+    :param list args: function, arguments
+
+    :return: iterator over results
+    """
+    func, params = args[0], args[1:]
+    if parallel_profile is None:
+        for result in imap(func, *params):
+            yield result
+    elif is_local_profile(parallel_profile):
+        pool = LocalPool(parallel_profile)
+        try:
+            for result in pool.imap_unordered(func, *params):
+                yield result
+        finally:
+            pool.close()
     else:
         from IPython.parallel import Client
 
-        return Client(profile=parallel_profile).load_balanced_view().map_sync(*args, **kw_args)
\ No newline at end of file
+        client = Client(profile=parallel_profile)
+        params = broadcast_arguments(client, parallel_profile, params)
+        for result in client.load_balanced_view().map(func, *params, ordered=False, block=False):
+            yield result
+
+
+def is_local_profile(parallel_profile):
+    """
+    :return: True if profile corresponds to pool on this machine ('threads-N' or 'processes-N')
+    """
+    return parallel_profile is not None and \
+        (str.startswith(parallel_profile, 'threads-') or str.startswith(parallel_profile, 'processes-'))
+
+
+class LocalPool(object):
+    """
+    Pool of threads ('threads-N' profile) or processes ('processes-N' profile) on this machine.
+    Large arrays and data frames are passed to processes through shared memory,
+    each object is written to shared memory once while pool is alive.
+
+    :param str parallel_profile: 'threads-N' or 'processes-N'
+    :param initializer: function called in each worker process with `initargs`
+        (not used with threads, which share objects with caller)
+    :param tuple initargs: arguments of initializer, are passed through shared memory
+    """
+    def __init__(self, parallel_profile, initializer=None, initargs=()):
+        assert is_local_profile(parallel_profile), 'Not a local profile: {}'.format(parallel_profile)
+        self.use_processes = str.startswith(parallel_profile, 'processes-')
+        self.n_workers = int(parallel_profile.split('-', 1)[1])
+        if self.use_processes:
+            self._shared_memory = _SharedMemory()
+            if initializer is not None:
+                initargs = ((initializer,) + tuple(self._shared_memory.share(arg) for arg in initargs),)
+                initializer = _processes_wrapper
+            self._pool = Pool(processes=self.n_workers, initializer=initializer, initargs=initargs)
+            self._wrapper = _processes_wrapper
+        else:
+            self._shared_memory = None
+            self._pool = ThreadPool(processes=self.n_workers)
+            self._wrapper = _threads_wrapper
+
+    def _prepare_tasks(self, func, params):
+        if self._shared_memory is not None:
+            params = [[self._shared_memory.share(value) for value in param] for param in params]
+        return zip(itertools.cycle([func]), *params)
+
+    def map(self, func, *params):
+        """ The same as map, results are returned in the order of arguments """
+        return self._pool.map(self._wrapper, self._prepare_tasks(func, params))
+
+    def imap_unordered(self, func, *params):
+        """ Iterator over results in the order of their computation """
+        return self._pool.imap_unordered(self._wrapper, self._prepare_tasks(func, params))
+
+    def apply_async(self, func, *args):
+        """
+        :return: AsyncResult for func(*args)
+        """
+        if self._shared_memory is not None:
+            args = [self._shared_memory.share(arg) for arg in args]
+        return self._pool.apply_async(self._wrapper, ((func,) + tuple(args),))
+
+    def close(self):
+        """ Wait for submitted tasks, stop workers and remove shared data """
+        self._pool.close()
+        self._pool.join()
+        if self._shared_memory is not None:
+            self._shared_memory.clear()
+
+
+def broadcast_arguments(client, parallel_profile, params):
+    """
+    Replaces large arrays and data frames, which are used in several tasks, with references to their copies
+    on IPython engines. Each object is pushed to all engines once and is reused by later calls
+    in the same session (i.e. the same dataset in fit, predict and grid search),
+    object is pushed again if it was changed (see :func:`_get_signature`).
+
+    :param client: IPython.parallel.Client
+    :param str parallel_profile: the IPython cluster profile
+    :param params: sequences of arguments for tasks
+    :return: list of lists with arguments for tasks
+    """
+    _forget_dead_broadcasted(client, parallel_profile)
+    params = [list(param) for param in params]
+    occurrences = Counter(id(value) for param in params for value in param)
+    references = {}
+    for param in params:
+        for index, value in enumerate(param):
+            if occurrences[id(value)] == 1 and (parallel_profile, id(value)) not in _BROADCASTED:
+                continue
+            if id(value) not in references:
+                references[id(value)] = broadcast(client, parallel_profile, value)
+            param[index] = references[id(value)]
+    return params
+
+
+def broadcast(client, parallel_profile, value):
+    """
+    Sends large array or data frame to all IPython engines if it wasn't sent before.
+
+    :param client: IPython.parallel.Client
+    :param str parallel_profile: the IPython cluster profile
+    :param value: any object
+    :return: reference to the copy on engines for large arrays and data frames, the value itself otherwise
+    """
+    from IPython.parallel import Reference
+
+    _forget_dead_broadcasted(client, parallel_profile)
+    if not _is_large(value):
+        return value
+    return Reference(_push_once(client, (parallel_profile, id(value)), value))
+
+
+def _is_large(value):
+    if isinstance(value, pandas.DataFrame):
+        return value.shape[0] * value.shape[1] * 8 >= SHARING_MIN_BYTES
+    return isinstance(value, numpy.ndarray) and value.nbytes >= SHARING_MIN_BYTES
+
+
+def _push_once(client, key, value):
+    """
+    Push value to all engines if it wasn't pushed before (or was changed)
+
+    :return: name of variable on engines
+    """
+    fingerprint = _get_signature(value)
+    if key in _BROADCASTED:
+        reference, pushed_fingerprint, name = _BROADCASTED[key]
+        if reference() is value and pushed_fingerprint == fingerprint:
+            return name
+        client[:].execute('del {}'.format(name), block=True)
+    name = '_rep_broadcasted_{}'.format(next(_BROADCAST_COUNTER))
+    client[:].push({name: value}, block=True)
+    _BROADCASTED[key] = weakref.ref(value), fingerprint, name
+    return name
+
+
+def _get_signature(value):
+    """
+    Cheap check of content of array or data frame: shape, columns and fingerprint of evenly spaced rows
+    (fingerprint of the whole large dataset takes about the same time as pushing it).
+    Modification in place of values in rows, which are not in sample, is not detected.
+    """
+    rows = numpy.unique(numpy.linspace(0, len(value) - 1, _SIGNATURE_ROWS).astype(int)) if len(value) > 0 else []
+    if isinstance(value, pandas.DataFrame):
+        return get_fingerprint(value.shape, list(value.columns), [str(dtype) for dtype in value.dtypes],
+                               value.iloc[rows])
+    return get_fingerprint(value.shape, value.__array_interface__['data'][0], value[rows])
+
+
+def _forget_dead_broadcasted(client, parallel_profile):
+    """ Remove from engines objects, which were deleted in this session """
+    for key, (reference, _, name) in list(_BROADCASTED.items()):
+        if key[0] == parallel_profile and reference() is None:
+            client[:].execute('del {}'.format(name), block=True)
+            del _BROADCASTED[key]
+
+
+def predict_by_chunks(estimator, X, method='predict_proba', chunk_size=100000, parallel_profile=None,
+                      max_chunks_in_flight=None, **kwargs):
+    """
+    Computes predictions of trained estimator for large dataset: rows are split into chunks,
+    which are predicted in parallel by local pool of workers, output is reassembled in the original order.
+    Number of chunks processed simultaneously is bounded, so memory used for predictions is bounded too.
+
+    For :class:`FoldingClassifier` and :class:`FoldingRegressor` without `vote_function`
+    rows of each fold are predicted by chunks with the estimator of this fold,
+    so the result is the same as of folding predictions.
+
+    :param estimator: trained classifier or regressor
+    :param X: pandas.DataFrame of shape [n_samples, n_features]
+    :param str method: name of prediction method, 'predict_proba', 'predict' or 'decision_function'
+    :param int chunk_size: number of rows in one chunk
+    :param parallel_profile: None to predict chunks one by one in this process,
+        'threads-N' to use N threads, 'processes-N' to use N processes (data is shared with them via memory)
+    :type parallel_profile: None or str
+    :param max_chunks_in_flight: max number of chunks being predicted at the same time,
+        by default twice the number of workers
+    :type max_chunks_in_flight: None or int
+    :param kwargs: additional parameters passed to prediction method (i.e. vote_function)
+
+    :return: numpy.array with predictions of shape [n_samples, ...]
+    """
+    from .folding import FoldingBase, FoldingClassifier
+
+    if isinstance(estimator, FoldingBase) and kwargs.get('vote_function') is None \
+            and method in ['predict', 'predict_proba']:
+        # folding classifier predicts labels by its probabilities
+        fold_method = 'predict_proba' if isinstance(estimator, FoldingClassifier) else method
+        folds_column = estimator._get_folds_column(X)
+        X = estimator._get_features(X)
+        result = numpy.zeros((len(X),) + _get_prediction_shape(estimator, fold_method))
+        for fold, fold_estimator in enumerate(estimator.estimators):
+            mask = folds_column == fold
+            if not numpy.any(mask):
+                continue
+            prediction = predict_by_chunks(fold_estimator, X.iloc[mask, :], method=fold_method,
+                                           chunk_size=chunk_size, parallel_profile=parallel_profile,
+                                           max_chunks_in_flight=max_chunks_in_flight)
+            result[mask] = prediction
+        if fold_method != method:
+            return estimator.classes_.take(numpy.argmax(result, axis=1), axis=0)
+        return result
+
+    length = len(X)
+    shape = _get_prediction_shape(estimator, method)
+    chunks = [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+    if parallel_profile is None:
+        return _collect_chunks(length, shape, (_predict_chunk(estimator, X, method, start, stop, kwargs)
+                                               for start, stop in chunks))
+    if not is_local_profile(parallel_profile):
+        raise ValueError('Only local profiles are supported: threads-N or processes-N, got {}'
+                         .format(parallel_profile))
+
+    # estimator and data are sent to each process once, not with every chunk
+    pool = LocalPool(parallel_profile, initializer=_init_chunks_worker, initargs=(estimator, X))
+    if pool.use_processes:
+        estimator, X = None, None
+    if max_chunks_in_flight is None:
+        max_chunks_in_flight = 2 * pool.n_workers
+
+    def submit_chunks():
+        in_flight = deque()
+        for start, stop in chunks:
+            if len(in_flight) == max_chunks_in_flight:
+                yield in_flight.popleft().get()
+            in_flight.append(pool.apply_async(_predict_chunk, estimator, X, method, start, stop, kwargs))
+        while in_flight:
+            yield in_flight.popleft().get()
+
+    try:
+        return _collect_chunks(length, shape, submit_chunks())
+    finally:
+        pool.close()
+
+
+# estimator and data used by process predicting chunks
+_CHUNKS_WORKER = {}
+
+
+def _init_chunks_worker(estimator, X):
+    _CHUNKS_WORKER['estimator'] = estimator
+    _CHUNKS_WORKER['X'] = X
+
+
+def _predict_chunk(estimator, X, method, start, stop, kwargs):
+    if estimator is None:
+        estimator, X = _CHUNKS_WORKER['estimator'], _CHUNKS_WORKER['X']
+    return start, stop, getattr(estimator, method)(X.iloc[start:stop, :], **kwargs)
+
+
+def _get_prediction_shape(estimator, method):
+    """ Shape of prediction for one event """
+    if method == 'predict_proba':
+        return len(estimator.classes_),
+    return ()
+
+
+def _collect_chunks(length, shape, chunks):
+    """
+    Places predictions for chunks into one preallocated array
+
+    :param tuple shape: shape of prediction for one event, used if there are no chunks
+    """
+    result = None
+    for start, stop, prediction in chunks:
+        prediction = numpy.asarray(prediction)
+        if result is None:
+            result = numpy.zeros((length,) + prediction.shape[1:], dtype=prediction.dtype)
+        result[start:stop] = prediction
+    return result if result is not None else numpy.zeros((length,) + shape)
+
+
+class _SharedMemory(object):
+    """
+    Places arrays and data frames into shared memory (files in SHARED_MEMORY_DIR),
+    so worker processes attach them as memory-mapped arrays without copying.
+    The same object passed several times is written only once.
+
+    :param int min_bytes: smaller arrays are not shared, but passed as usual
+    """
+    def __init__(self, min_bytes=SHARING_MIN_BYTES):
+        self.min_bytes = min_bytes
+        self.directory = tempfile.mkdtemp(prefix='rep_', dir=SHARED_MEMORY_DIR)
+        # id -> (object, handle), objects are kept to guarantee that ids are not reused
+        self._handles = {}
+        self._counter = itertools.count()
+
+    def share(self, value):
+        """
+        :param value: any object passed to worker
+        :return: handle for large arrays and data frames, the same value otherwise
+        """
+        if id(value) in self._handles:
+            return self._handles[id(value)][1]
+        if isinstance(value, pandas.DataFrame):
+            if value.shape[1] == 0 or _get_shared_columns_bytes(value) < self.min_bytes:
+                return value
+            handle = self._share_data_frame(value)
+        elif isinstance(value, numpy.ndarray) and value.dtype != object and value.nbytes >= self.min_bytes:
+            handle = _SharedArray(self._write(value))
+        else:
+            return value
+        self._handles[id(value)] = value, handle
+        return handle
+
+    def _share_data_frame(self, value):
+        """
+        Columns of each numerical dtype are written to one shared array,
+        frame is restored from consecutive groups of columns, so order of columns is kept.
+        """
+        # numerical dtypes are compared by string representation, since numpy.dtype('float64') == None
+        dtypes = [dtype.str if _is_shareable_dtype(dtype) else None for dtype in value.dtypes]
+        # dtype -> (shared array, positions of columns in frame)
+        arrays = OrderedDict()
+        for dtype in dtypes:
+            if dtype is not None and dtype not in arrays:
+                positions = [i for i, column_dtype in enumerate(dtypes) if column_dtype == dtype]
+                arrays[dtype] = self._share_array(value.iloc[:, positions].values), positions
+        not_shared = [i for i, dtype in enumerate(dtypes) if dtype is None]
+        if len(not_shared) > 0:
+            logger = logging.getLogger(__name__)
+            logger.info('Columns {} are passed to processes without sharing'.format(list(value.columns[not_shared])))
+
+        pieces = []
+        for dtype, group in itertools.groupby(range(len(dtypes)), key=lambda i: dtypes[i]):
+            group = list(group)
+            if dtype is not None:
+                array, positions = arrays[dtype]
+                start = positions.index(group[0])
+                pieces.append((array, start, start + len(group), list(value.columns[group])))
+            else:
+                pieces.append(value.iloc[:, group].reset_index(drop=True))
+        return _SharedDataFrame(self._get_path('frame'), pieces, self.share(value.index.values))
+
+    def _share_array(self, array):
+        return _SharedArray(self._write(array))
+
+    def _get_path(self, suffix):
+        return os.path.join(self.directory, '{}.{}'.format(next(self._counter), suffix))
+
+    def _write(self, array):
+        path = self._get_path('npy')
+        numpy.save(path, array)
+        return path
+
+    def clear(self):
+        """ Remove all shared data """
+        self._handles = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# attached in this process shared objects: path -> object
+_ATTACHED = {}
+
+
+def _is_shareable_dtype(dtype):
+    return isinstance(dtype, numpy.dtype) and dtype != object
+
+
+def _get_shared_columns_bytes(data_frame):
+    """ Number of bytes in columns of data frame, which can be placed into shared memory """
+    return sum(len(data_frame) * dtype.itemsize for dtype in data_frame.dtypes if _is_shareable_dtype(dtype))
+
+
+class _SharedHandle(object):
+    """ Reference to object in shared memory, which is passed to workers instead of object """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def attach(self):
+        """
+        :return: object attached from shared memory in this process
+        """
+        pass
+
+
+class _SharedArray(_SharedHandle):
+    def __init__(self, path):
+        self.path = path
+
+    def attach(self):
+        if self.path not in _ATTACHED:
+            # copy-on-write mapping: changes made by worker aren't visible to others
+            _ATTACHED[self.path] = numpy.load(self.path, mmap_mode='c')
+        return _ATTACHED[self.path]
+
+
+class _SharedDataFrame(_SharedHandle):
+    """
+    :param str path: unique name of frame
+    :param list pieces: consecutive groups of columns, each group is either tuple
+        (shared array with columns of the same dtype, first column, last column + 1, names of columns)
+        or data frame with columns, which are not shared
+    :param index: index of frame (or handle to it)
+    """
+    def __init__(self, path, pieces, index):
+        self.path = path
+        self.pieces = pieces
+        self.index = index
+
+    def attach(self):
+        if self.path not in _ATTACHED:
+            index = self.index.attach() if isinstance(self.index, _SharedHandle) else self.index
+            frames = []
+            for piece in self.pieces:
+                if isinstance(piece, pandas.DataFrame):
+                    piece.index = index
+                    frames.append(piece)
+                else:
+                    array, start, stop, columns = piece
+                    frames.append(pandas.DataFrame(array.attach()[:, start:stop], columns=columns, index=index,
+                                                   copy=False))
+            _ATTACHED[self.path] = frames[0] if len(frames) == 1 else pandas.concat(frames, axis=1, copy=False)
+        return _ATTACHED[self.path]
@@ -3,6 +3,7 @@ from abc import ABCMeta, abstractmethod
 import numpy
 import pandas
 import copy
+import os
 from collections import OrderedDict
 from .. import plotting
 from .. import utils
@@ -14,29 +15,94 @@ class AbstractReport:
     """
     Provides methods used both in Classification and Regression reports
 
+    Predictions of estimators are computed lazily, when they are used first time.
+
     Parameters:
     -----------
     :type lds: rep.data.storage.LabeledDataStorage
     :type estimators: dict[str, Classifier] or dict[str, Regressor]
+    :param parallel_profile: profile of parallel execution system or None,
+        used to compute predictions of several estimators simultaneously
+    :type parallel_profile: None or str
+    :param cache_dir: folder to keep computed predictions, predictions of the same estimator
+        on the same data are loaded from it instead of computing
+    :type cache_dir: None or str
     """
     __metaclass__ = ABCMeta
+    # type of prediction used in rep.metaml.factory.predict_estimator
+    _prediction_type = None
 
-    def __init__(self, estimators, lds):
+    def __init__(self, estimators, lds, parallel_profile=None, cache_dir=None):
         self.lds = lds
         if not isinstance(estimators, OrderedDict):
             estimators = OrderedDict(estimators)
 
         self.estimators = estimators
+        self.parallel_profile = parallel_profile
+        self.cache_dir = cache_dir
+        # packed masks for string expressions
+        self._masks = {}
+        # data itself is not kept in report, it is taken from lds when predictions are computed
+        self._data_fingerprint = None
 
-        self.prediction = OrderedDict()
-        X = lds.get_data()
-        for name, estimator in self.estimators.items():
-            self.prediction[name] = self._predict(estimator, X)
+        self.prediction = _LazyPredictions(self)
 
         self.target, self.weight = lds.get_targets(), lds.get_weights()
 
-        self.common_features = list(
-            set.intersection(*[set(estimator.features) for name, estimator in self.estimators.items()]))
+        # estimators with None features (i.e. folding with fold columns) don't restrict common features
+        features = [set(estimator.features) for estimator in self.estimators.values() if estimator.features is not None]
+        self.common_features = list(set.intersection(*features)) if len(features) > 0 else []
+
+    def _get_cache_path(self, name):
+        """
+        :return: path to file with stored prediction of estimator on data (fingerprint of data should be computed)
+        """
+        estimator_fingerprint = utils.get_fingerprint(self.estimators[name])
+        return os.path.join(self.cache_dir, '{}_{}.npy'.format(estimator_fingerprint, self._data_fingerprint))
+
+    def _compute_predictions(self, names):
+        """
+        Compute predictions of estimators (using stored predictions if cache_dir was passed)
+
+        :param list[str] names: names of estimators
+        :rtype: OrderedDict[numpy.array]
+        """
+        predictions = OrderedDict()
+        # data, on which estimators are tested, is released when predictions are computed
+        X = None
+        if self.cache_dir is not None:
+            if self._data_fingerprint is None:
+                X = self.lds.get_data()
+                self._data_fingerprint = utils.get_fingerprint(X)
+            for name in names:
+                path = self._get_cache_path(name)
+                if os.path.exists(path):
+                    predictions[name] = numpy.load(path)
+
+        names = [name for name in names if name not in predictions]
+        if len(names) > 0 and X is None:
+            X = self.lds.get_data()
+        if self.parallel_profile is None or len(names) <= 1:
+            for name in names:
+                predictions[name] = self._predict(self.estimators[name], X)
+        else:
+            from ..metaml.utils import map_on_cluster
+            from ..metaml.factory import predict_estimator
+            result = map_on_cluster(self.parallel_profile, predict_estimator, names,
+                                    [self.estimators[name] for name in names], [X] * len(names),
+                                    [self._prediction_type] * len(names))
+            for status, data in result:
+                if status != 'success':
+                    raise RuntimeError('Problem while predicting on the node, report:\n{}'.format(data))
+                name, prediction, _ = data
+                predictions[name] = prediction
+
+        if self.cache_dir is not None:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            for name in names:
+                numpy.save(self._get_cache_path(name), predictions[name])
+        return predictions
 
     @abstractmethod
     def _predict(self, estimator, X):
@@ -46,10 +112,24 @@ class AbstractReport:
     def _apply_mask(self, mask, *args):
         if mask is None:
             return tuple([numpy.ones(len(self.lds), dtype=bool)] + list(args))
-        mask = self.lds.eval_column(mask)
+        mask = self._eval_mask(mask)
         mask_data = [data.iloc[mask, :] if isinstance(data, pandas.DataFrame) else data[mask] for data in args]
         return tuple([mask] + mask_data)
 
+    def _eval_mask(self, mask):
+        """
+        Evaluate mask over dataset. Masks defined by string expressions are evaluated only once
+        and kept in compact form.
+        """
+        if not isinstance(mask, str):
+            return self.lds.eval_column(mask)
+        if mask not in self._masks:
+            evaluated_mask = self.lds.eval_column(mask)
+            if evaluated_mask.dtype != bool:
+                return evaluated_mask
+            self._masks[mask] = _PackedMask(evaluated_mask)
+        return self._masks[mask].unpack()
+
     def _get_features(self, features=None):
         return self.lds.get_data(features=features)
 
@@ -210,4 +290,72 @@ class AbstractReport:
         quality = OrderedDict()
         for estimator_name, prediction in self.prediction.items():
             quality[estimator_name] = metric_func(labels, prediction[mask], sample_weight=weight)
-        return quality
\ No newline at end of file
+        return quality
+
+
+class _PackedMask(object):
+    """
+    Boolean mask kept in compact form: indices of selected events or bitmap, whichever is smaller.
+
+    :param numpy.array mask: boolean mask
+    """
+    def __init__(self, mask):
+        self.length = len(mask)
+        indices = numpy.flatnonzero(mask)
+        if indices.nbytes * 8 < self.length:
+            self.indices, self.bits = indices, None
+        else:
+            self.indices, self.bits = None, numpy.packbits(mask)
+
+    def unpack(self):
+        """
+        :return: boolean mask of shape [n_samples]
+        """
+        if self.bits is not None:
+            return numpy.unpackbits(self.bits)[:self.length].view(dtype=bool)
+        mask = numpy.zeros(self.length, dtype=bool)
+        mask[self.indices] = True
+        return mask
+
+
+class _LazyPredictions(object):
+    """
+    Ordered collection of estimators' predictions (name -> prediction), which are computed by report
+    only when requested. When all predictions are used (`items`, `values`), missing ones are computed together,
+    so they can be computed in parallel.
+
+    :type report: AbstractReport
+    """
+    def __init__(self, report):
+        self.report = report
+        self._predictions = {}
+
+    def _compute(self, names):
+        missing = [name for name in names if name not in self._predictions]
+        if len(missing) > 0:
+            self._predictions.update(self.report._compute_predictions(missing))
+
+    def __getitem__(self, name):
+        if name not in self.report.estimators:
+            raise KeyError(name)
+        self._compute([name])
+        return self._predictions[name]
+
+    def __iter__(self):
+        return iter(self.report.estimators.keys())
+
+    def __len__(self):
+        return len(self.report.estimators)
+
+    def __contains__(self, name):
+        return name in self.report.estimators
+
+    def keys(self):
+        return list(self.report.estimators.keys())
+
+    def values(self):
+        return [prediction for _, prediction in self.items()]
+
+    def items(self):
+        self._compute(self.keys())
+        return [(name, self._predictions[name]) for name in self.keys()]
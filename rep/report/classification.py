@@ -45,13 +45,22 @@ class ClassificationReport(AbstractReport):
     :param classifiers: estimators
     :type classifiers: dict[str, Classifier]
     :param LabeledDataStorage lds: data
+    :param parallel_profile: profile of parallel execution system or None,
+        used to compute predictions of several estimators simultaneously
+    :type parallel_profile: None or str
+    :param cache_dir: folder to keep computed predictions, predictions of the same estimator
+        on the same data are loaded from it instead of computing
+    :type cache_dir: None or str
     """
-    def __init__(self, classifiers, lds):
+    _prediction_type = 'classification-proba'
+
+    def __init__(self, classifiers, lds, parallel_profile=None, cache_dir=None):
 
         for name, classifier in classifiers.items():
             assert isinstance(classifier, Classifier), "Object {} doesn't implement interface".format(name)
 
-        AbstractReport.__init__(self, lds=lds, estimators=classifiers)
+        AbstractReport.__init__(self, lds=lds, estimators=classifiers, parallel_profile=parallel_profile,
+                                cache_dir=cache_dir)
 
     def _predict(self, estimator, X):
         return estimator.predict_proba(X)
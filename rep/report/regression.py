@@ -34,12 +34,21 @@ class RegressionReport(AbstractReport):
     :param regressors: OrderedDict with regressors (RegressionFactory)
     :type regressors: dict[str, Regressor]
     :param LabeledDataStorage lds: data
+    :param parallel_profile: profile of parallel execution system or None,
+        used to compute predictions of several estimators simultaneously
+    :type parallel_profile: None or str
+    :param cache_dir: folder to keep computed predictions, predictions of the same estimator
+        on the same data are loaded from it instead of computing
+    :type cache_dir: None or str
     """
 
-    def __init__(self, regressors, lds):
+    _prediction_type = 'regression'
+
+    def __init__(self, regressors, lds, parallel_profile=None, cache_dir=None):
         for name, regressor in regressors.items():
             assert isinstance(regressor, Regressor), "Object {} doesn't implement interface".format(name)
-        AbstractReport.__init__(self, lds=lds, estimators=regressors)
+        AbstractReport.__init__(self, lds=lds, estimators=regressors, parallel_profile=parallel_profile,
+                                cache_dir=cache_dir)
 
     def _predict(self, estimator, X):
         return estimator.predict(X)
@@ -4,10 +4,15 @@ Different helpful functions, objects, methods are collected here.
 
 from __future__ import division, print_function, absolute_import
 from collections import OrderedDict
+import hashlib
+import re
+import threading
+import weakref
 import numexpr
 
 import numpy
 import pandas
+from six.moves import cPickle
 from sklearn.utils.validation import column_or_1d
 from sklearn.metrics import roc_curve
 
@@ -347,6 +352,18 @@ def train_test_split_group(group_column, *arrays, **kw_args):
     return result
 
 
+# parsed feature expressions: tuple of columns -> OrderedDict (new column: expression)
+_COLUMNS_DICT_CACHE = {}
+_COLUMNS_DICT_CACHE_SIZE = 1000
+# evaluated feature expressions: id(data) -> (weak reference to data, {expression: (source columns, values)})
+_EXPRESSIONS_CACHE = OrderedDict()
+# number of data frames for which evaluated expressions are kept
+_EXPRESSIONS_CACHE_SIZE = 4
+# reentrant, since weak reference callback may be called by garbage collector while lock is held
+_EXPRESSIONS_CACHE_LOCK = threading.RLock()
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z_0-9]*')
+
+
 def get_columns_dict(columns):
     """
     Get (new column: old column) dict expressions
@@ -354,21 +371,35 @@ def get_columns_dict(columns):
     :param list[str] columns: columns names
     :rtype: dict
     """
-    result = OrderedDict()
-    for column in columns:
-        column_split = column.split(':')
-        assert len(column_split) < 3, 'Error in parsing feature expression {}'.format(column)
-        if len(column_split) == 2:
-            result[column_split[0].strip()] = column_split[1].strip()
-        else:
-            result[column] = column
-    return result
+    key = tuple(columns)
+    if key not in _COLUMNS_DICT_CACHE:
+        result = OrderedDict()
+        for column in key:
+            column_split = column.split(':')
+            assert len(column_split) < 3, 'Error in parsing feature expression {}'.format(column)
+            if len(column_split) == 2:
+                result[column_split[0].strip()] = column_split[1].strip()
+            else:
+                result[column] = column
+        if len(_COLUMNS_DICT_CACHE) >= _COLUMNS_DICT_CACHE_SIZE:
+            _COLUMNS_DICT_CACHE.clear()
+        _COLUMNS_DICT_CACHE[key] = result
+    return OrderedDict(_COLUMNS_DICT_CACHE[key])
 
 
 def get_columns_in_df(df, columns):
     """
     Get columns in data frame using *numexpr* evaluation
 
+    Plain columns are taken without evaluation, each distinct expression is evaluated once.
+    Evaluated expressions are memoized for the last used data frames, so repeated calls on the same frame
+    (i.e. several predictions) don't recompute them. Results are recomputed if columns used by expression
+    were replaced (i.e. `df['x'] = ...`).
+
+    .. warning:: modification of values in place (i.e. `df.values[...] = ...` or `df['x'].values[:] = ...`)
+        is not detected, memoized results of expressions become stale.
+        Call :func:`clear_expressions_cache` after such modifications.
+
     :param pandas.DataFrame df: data
     :param columns: necessary columns
     :param columns: None or list[str]
@@ -377,12 +408,68 @@ def get_columns_in_df(df, columns):
     if columns is None:
         return df
     columns_dict = get_columns_dict(columns)
+    evaluated = _get_evaluated_expressions(df)
     df_new = OrderedDict()
     for column_new, column in columns_dict.items():
-        df_new[column_new] = numexpr.evaluate(column, local_dict=df)
+        if column in df.columns:
+            df_new[column_new] = numpy.asarray(df[column])
+        else:
+            df_new[column_new] = _evaluate_expression(df, column, evaluated)
     return pandas.DataFrame(df_new)
 
 
+def clear_expressions_cache():
+    """
+    Forget all memoized results of feature expressions evaluation (see :func:`get_columns_in_df`)
+    """
+    with _EXPRESSIONS_CACHE_LOCK:
+        _EXPRESSIONS_CACHE.clear()
+
+
+def _get_evaluated_expressions(df):
+    """
+    :return: dict with memoized results of expressions for data frame (empty dict if frame can't be memoized)
+    """
+    key = id(df)
+    with _EXPRESSIONS_CACHE_LOCK:
+        entry = _EXPRESSIONS_CACHE.pop(key, None)
+        if entry is None or entry[0]() is not df:
+            try:
+                entry = weakref.ref(df, lambda reference: _forget_evaluated_expressions(key, reference)), {}
+            except TypeError:
+                # objects without weak references are not memoized
+                return {}
+        _EXPRESSIONS_CACHE[key] = entry
+        while len(_EXPRESSIONS_CACHE) > _EXPRESSIONS_CACHE_SIZE:
+            _EXPRESSIONS_CACHE.popitem(last=False)
+    return entry[1]
+
+
+def _forget_evaluated_expressions(key, reference):
+    """ Removes memoized results for data frame, which was deleted """
+    with _EXPRESSIONS_CACHE_LOCK:
+        entry = _EXPRESSIONS_CACHE.get(key)
+        # id may be already reused by other data frame
+        if entry is not None and entry[0] is reference:
+            del _EXPRESSIONS_CACHE[key]
+
+
+def _evaluate_expression(df, expression, evaluated):
+    """
+    Evaluate expression with *numexpr* or take the result from `evaluated` if source columns weren't replaced
+
+    :param dict evaluated: expression -> (source columns, values), will be updated
+    """
+    if expression in evaluated:
+        sources, values = evaluated[expression]
+        if all(df[name] is column for name, column in sources):
+            return values
+    sources = tuple((name, df[name]) for name in set(_IDENTIFIER.findall(expression)) if name in df.columns)
+    values = numexpr.evaluate(expression, local_dict=df)
+    evaluated[expression] = sources, values
+    return values
+
+
 def check_arrays(*arrays):
     assert len(arrays) > 0, 'The number of array must be greater than zero'
     checked_arrays = []
@@ -395,3 +482,29 @@ def check_arrays(*arrays):
             checked_arrays.append(arr)
     assert numpy.sum(numpy.array(shapes) == shapes[0]) == len(shapes), 'Different shapes of the arrays {}'.format(shapes)
     return checked_arrays
+
+
+def get_fingerprint(*objects):
+    """
+    Compute hash of objects, which is used as key for stored results (i.e. predictions of estimator on dataset).
+    Arrays and data frames are hashed by their content, other objects (estimators, parameters) by pickled state.
+
+    :param objects: pandas.DataFrame, numpy.array or any picklable objects
+    :rtype: str
+    """
+    digest = hashlib.md5()
+    for obj in objects:
+        _update_fingerprint(digest, obj)
+    return digest.hexdigest()
+
+
+def _update_fingerprint(digest, obj):
+    if isinstance(obj, pandas.DataFrame):
+        digest.update(cPickle.dumps(list(obj.columns), protocol=2))
+        for column in obj.columns:
+            _update_fingerprint(digest, numpy.asarray(obj[column]))
+    elif isinstance(obj, numpy.ndarray) and obj.dtype != object:
+        digest.update(cPickle.dumps((obj.dtype.str, obj.shape), protocol=2))
+        digest.update(numpy.ascontiguousarray(obj).view(numpy.uint8))
+    else:
+        digest.update(cPickle.dumps(obj, protocol=2))
@@ -5,7 +5,8 @@ from sklearn.metrics import accuracy_score, roc_auc_score
 import numpy
 
 from rep.data import LabeledDataStorage
-from rep.metaml import ClassifiersFactory
+from rep.metaml import ClassifiersFactory, FoldingClassifier
+from rep.metaml.utils import predict_by_chunks, LocalPool, _SharedMemory, _SharedDataFrame
 from six.moves import cPickle
 from rep.report import ClassificationReport
 from rep.report.metrics import significance
@@ -76,6 +77,88 @@ def test_factory():
     check_report_with_mask(report, None, X)
 
 
+def test_factory_processes():
+    factory = ClassifiersFactory()
+    factory.add_classifier('rf', RandomForestClassifier(n_estimators=10))
+    factory.add_classifier('ada', AdaBoostClassifier(n_estimators=20))
+
+    X, y, sample_weight = generate_classification_data()
+    factory.fit(X, y, sample_weight=sample_weight, parallel_profile='processes-2')
+    proba = factory.predict_proba(X, parallel_profile='processes-2')
+    for key, val in proba.items():
+        assert numpy.allclose(val, factory[key].predict_proba(X)), key
+        assert roc_auc_score(y, val[:, 1]) > 0.8, key
+
+
+def test_predict_by_chunks():
+    X, y, sample_weight = generate_classification_data()
+    factory = ClassifiersFactory()
+    factory.add_classifier('rf', RandomForestClassifier(n_estimators=10))
+    factory.fit(X, y, sample_weight=sample_weight)
+    classifier = factory['rf']
+    for parallel_profile in [None, 'threads-3', 'processes-2']:
+        proba = predict_by_chunks(classifier, X, chunk_size=70, parallel_profile=parallel_profile,
+                                  max_chunks_in_flight=2)
+        assert numpy.allclose(proba, classifier.predict_proba(X)), parallel_profile
+        labels = predict_by_chunks(classifier, X, method='predict', chunk_size=70, parallel_profile=parallel_profile)
+        assert numpy.all(labels == classifier.predict(X)), parallel_profile
+
+
+def test_predict_by_chunks_empty():
+    X, y, sample_weight = generate_classification_data()
+    folding = FoldingClassifier(RandomForestClassifier(n_estimators=10), n_folds=3,
+                                fold_columns=[X.columns[0]]).fit(X, y)
+    for parallel_profile in [None, 'threads-2']:
+        # folds of single event are empty except one
+        proba = predict_by_chunks(folding, X.iloc[:1, :], parallel_profile=parallel_profile)
+        fold = int(folding._get_folds_column(X.iloc[:1, :])[0])
+        assert numpy.allclose(proba, folding.estimators[fold].predict_proba(X.iloc[:1, 1:])), parallel_profile
+        proba = predict_by_chunks(folding.estimators[0], X.iloc[:0, 1:], parallel_profile=parallel_profile)
+        assert proba.shape == (0, 2), parallel_profile
+
+
+def _generate_mixed_data():
+    X, y, sample_weight = generate_classification_data()
+    X.insert(1, 'int_column', numpy.arange(len(X)))
+    X.insert(3, 'small_int_column', (numpy.arange(len(X)) % 7).astype('int8'))
+    X['str_column'] = 'event'
+    return X
+
+
+def test_shared_data_frame():
+    X = _generate_mixed_data()
+    shared_memory = _SharedMemory(min_bytes=0)
+    try:
+        handle = shared_memory.share(X)
+        assert isinstance(handle, _SharedDataFrame)
+        assert shared_memory.share(X) is handle
+        attached = handle.attach()
+        assert list(attached.columns) == list(X.columns)
+        assert list(attached.dtypes) == list(X.dtypes)
+        assert numpy.all(attached.index == X.index)
+        for column in X.columns:
+            assert numpy.all(attached[column].values == X[column].values), column
+    finally:
+        shared_memory.clear()
+
+
+def _sum_numerical_columns(X):
+    return X.select_dtypes(include=[numpy.number]).sum().values
+
+
+def test_local_pool_shares_data_frame():
+    X = _generate_mixed_data()
+    pool = LocalPool('processes-2')
+    try:
+        pool._shared_memory.min_bytes = 0
+        result = pool.apply_async(_sum_numerical_columns, X)
+        # frame with mixed dtypes is passed to worker as handle to shared memory, not pickled
+        assert isinstance(pool._shared_memory._handles[id(X)][1], _SharedDataFrame)
+        assert numpy.allclose(result.get(), _sum_numerical_columns(X))
+    finally:
+        pool.close()
+
+
 def roc_auc_score_mod(y_true, prob, sample_weight=None):
     return roc_auc_score(y_true, prob[:, 1], sample_weight=sample_weight)
 
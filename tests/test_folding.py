@@ -1,13 +1,16 @@
 from __future__ import division, print_function, absolute_import
 
 import numpy
-from sklearn.ensemble import AdaBoostClassifier
+from sklearn import clone
+from sklearn.ensemble import AdaBoostClassifier, AdaBoostRegressor
 from sklearn.svm import SVC
 from sklearn.metrics.metrics import accuracy_score, roc_auc_score
 
-from rep.estimators import SklearnClassifier
-from rep.metaml import FoldingClassifier
-from rep.test.test_estimators import generate_classification_data, check_classification_model
+from rep.estimators import SklearnClassifier, SklearnRegressor
+from rep.metaml import FoldingClassifier, FoldingRegressor
+from rep.metaml.utils import predict_by_chunks
+from rep.test.test_estimators import generate_classification_data, generate_regression_data, \
+    check_classification_model
 
 __author__ = 'antares'
 
@@ -51,4 +54,100 @@ def test_folding():
 
     base_ada = SklearnClassifier(SVC())
     folding_str = FoldingClassifier(base_ada, n_folds=4)
-    check_folding(folding_str, True, False, False)
\ No newline at end of file
+    check_folding(folding_str, True, False, False)
+
+
+def test_folding_predict_by_chunks():
+    X, y, sample_weight = generate_classification_data()
+    folding = FoldingClassifier(SklearnClassifier(AdaBoostClassifier(n_estimators=10)), n_folds=3)
+    folding.fit(X, y, sample_weight=sample_weight)
+
+    def mean_vote(x):
+        return numpy.mean(x, axis=0)
+
+    for vote_function in [None, mean_vote]:
+        proba = predict_by_chunks(folding, X, chunk_size=50, parallel_profile='threads-2',
+                                  vote_function=vote_function)
+        assert numpy.allclose(proba, folding.predict_proba(X, vote_function=vote_function))
+
+
+def test_folding_parallel_training():
+    X, y, sample_weight = generate_classification_data()
+    base = SklearnClassifier(AdaBoostClassifier(n_estimators=10))
+    proba = FoldingClassifier(base, n_folds=3, random_state=13).fit(X, y, sample_weight).predict_proba(X)
+    for ipc_profile in ['threads-2', 'processes-2']:
+        folding = FoldingClassifier(base, n_folds=3, random_state=13, ipc_profile=ipc_profile)
+        folding.fit(X, y, sample_weight=sample_weight)
+        assert numpy.allclose(proba, folding.predict_proba(X)), ipc_profile
+
+
+def test_folding_hash_folds():
+    X, y, sample_weight = generate_classification_data()
+    X['event_id'] = numpy.arange(len(X)) * 7
+    folding = FoldingClassifier(SklearnClassifier(AdaBoostClassifier(n_estimators=10)), n_folds=3,
+                                fold_columns='event_id')
+    folding.fit(X, y, sample_weight=sample_weight)
+    # constructor parameter is not changed by training
+    assert folding.features is None and clone(folding).features is None
+    assert 'event_id' not in folding._features
+    proba = folding.predict_proba(X)
+    # folds don't depend on order of events and on the way data is split into chunks
+    permutation = numpy.random.permutation(len(X))
+    assert numpy.allclose(folding.predict_proba(X.iloc[permutation, :]), proba[permutation])
+    assert numpy.allclose(folding.predict_proba(X.iloc[:100, :]), proba[:100])
+    # small chunks contain no events of some folds
+    for chunk_size in [1, 2]:
+        chunks = [folding.predict_proba(X.iloc[start:start + chunk_size, :]) for start in range(0, 20, chunk_size)]
+        assert numpy.allclose(numpy.concatenate(chunks), proba[:20]), chunk_size
+    for staged_proba in folding.staged_predict_proba(X.iloc[:1, :]):
+        assert staged_proba.shape == (1, 2)
+    assert numpy.allclose(staged_proba, proba[:1])
+    assert folding.predict_proba(X.iloc[:0, :]).shape == (0, 2)
+    X['event_id'] = X['event_id'].astype(float)
+    assert numpy.allclose(folding.predict_proba(X), proba)
+
+    # features are resolved again for data with other columns
+    folding.fit(X.drop(X.columns[0], axis=1), y, sample_weight=sample_weight)
+    assert list(folding._features) == [column for column in X.columns[1:] if column != 'event_id']
+
+
+def test_folding_votes():
+    X, y, sample_weight = generate_classification_data()
+    folding = FoldingClassifier(SklearnClassifier(AdaBoostClassifier(n_estimators=10)), n_folds=3)
+    folding.fit(X, y, sample_weight=sample_weight)
+    votes = {'mean': lambda x: numpy.mean(x, axis=0),
+             'median': lambda x: numpy.median(x, axis=0),
+             'geometric_mean': lambda x: numpy.exp(numpy.mean(numpy.log(x), axis=0)),
+             'max': lambda x: numpy.max(x, axis=0)}
+    for ipc_profile in [None, 'threads-2', 'processes-2']:
+        folding.ipc_profile = ipc_profile
+        for name, vote_function in votes.items():
+            expected = folding.predict_proba(X, vote_function=vote_function)
+            assert numpy.allclose(folding.predict_proba(X, vote_function=name), expected), (name, ipc_profile)
+    for p_name, p_function in zip(folding.staged_predict_proba(X, vote_function='mean'),
+                                  folding.staged_predict_proba(X, vote_function=votes['mean'])):
+        assert numpy.allclose(p_name, p_function)
+
+
+def test_folding_regressor():
+    X, y, sample_weight = generate_regression_data()
+    base = SklearnRegressor(AdaBoostRegressor(n_estimators=10, random_state=11))
+    folding = FoldingRegressor(base, n_folds=3, random_state=13)
+    folding.fit(X, y, sample_weight=sample_weight)
+    predictions = folding.predict(X)
+    assert predictions.shape == (len(X),)
+    folds_column = folding._get_folds_column(X)
+    for fold, estimator in enumerate(folding.estimators):
+        mask = folds_column == fold
+        assert numpy.allclose(predictions[mask], estimator.predict(X.iloc[mask, :]))
+    for p in folding.staged_predict(X):
+        assert p.shape == (len(X),)
+    assert numpy.allclose(p, predictions)
+
+    mean_predictions = folding.predict(X, vote_function='mean')
+    assert numpy.allclose(mean_predictions, numpy.mean([estimator.predict(X) for estimator in folding.estimators],
+                                                       axis=0))
+    parallel_folding = FoldingRegressor(base, n_folds=3, random_state=13, ipc_profile='processes-2')
+    parallel_folding.fit(X, y, sample_weight=sample_weight)
+    assert numpy.allclose(parallel_folding.predict(X), predictions)
+    assert numpy.allclose(predict_by_chunks(folding, X, method='predict', chunk_size=70), predictions)
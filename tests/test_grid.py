@@ -1,12 +1,21 @@
 from __future__ import division, print_function, absolute_import
 from collections import OrderedDict
+import gc
+import os
+import shutil
+import tempfile
 
+import numpy
 from sklearn import clone
 from sklearn.ensemble import AdaBoostClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import roc_auc_score
+from six.moves import cPickle
 
 from rep.metaml import GridOptimalSearchCV, SubgridParameterOptimizer, FoldingScorer, \
-    RegressionParameterOptimizer
+    RegressionParameterOptimizer, RandomParameterOptimizer, FoldingScore
+from rep.metaml import gridsearch
+from rep.metaml.gridsearch import AnnealingParameterOptimizer, HalvingParameterOptimizer, _get_folds
 from rep.test.test_estimators import generate_classification_data, check_grid, run_grid
 from rep.estimators import SklearnClassifier
 
@@ -83,4 +92,184 @@ def test_grid():
 
     grid_custom(generate_scorer(X, y))
     run_grid(grid_sklearn)
-    run_grid(grid_tmva)
\ No newline at end of file
+    run_grid(grid_tmva)
+
+
+def roc_auc_score_mod(y_true, prob, sample_weight=None):
+    return roc_auc_score(y_true, prob[:, 1], sample_weight=sample_weight)
+
+
+def test_grid_local_pools():
+    X, y, sample_weight = generate_classification_data()
+    grid_param = OrderedDict({"n_estimators": [5, 10], "learning_rate": [0.1, 0.05]})
+    for parallel_profile in ['threads-2', 'processes-2']:
+        generator = RandomParameterOptimizer(grid_param, n_evaluations=4)
+        grid = GridOptimalSearchCV(SklearnClassifier(clf=AdaBoostClassifier()), generator,
+                                   FoldingScorer(roc_auc_score_mod), parallel_profile=parallel_profile)
+        grid.fit(X, y, sample_weight=sample_weight)
+        assert len(generator.grid_scores_) == 4, parallel_profile
+        assert all(score > 0.7 for score in generator.grid_scores_.values()), parallel_profile
+
+
+def test_grid_staged_parameter():
+    X, y, sample_weight = generate_classification_data()
+    base = SklearnClassifier(clf=AdaBoostClassifier(random_state=0))
+    scorer = FoldingScorer(roc_auc_score_mod)
+    staged_scores = scorer.staged_call(base, {'learning_rate': 0.1}, X, y, sample_weight,
+                                       stage_param='n_estimators', stage_values=[20, 5, 10])
+    for n_estimators, score in staged_scores.items():
+        params = {'learning_rate': 0.1, 'n_estimators': n_estimators}
+        assert numpy.allclose(score, scorer(base, params, X, y, sample_weight)), n_estimators
+
+    class CountingScorer(FoldingScorer):
+        def staged_call(self, *args, **kwargs):
+            self.n_trainings += 1
+            return FoldingScorer.staged_call(self, *args, **kwargs)
+
+    grid_param = OrderedDict({"n_estimators": [5, 10, 20], "learning_rate": [0.1, 0.05]})
+    for parallel_profile in [None, 'threads-2']:
+        generator = RandomParameterOptimizer(grid_param, n_evaluations=6)
+        counting_scorer = CountingScorer(roc_auc_score_mod)
+        counting_scorer.n_trainings = 0
+        grid = GridOptimalSearchCV(base, generator, counting_scorer, parallel_profile=parallel_profile,
+                                   stage_param='n_estimators')
+        grid.fit(X, y, sample_weight=sample_weight)
+        assert len(generator.grid_scores_) == 6
+        # one training for each learning rate
+        assert counting_scorer.n_trainings == 2
+        # costs of models with more stages are larger
+        for learning_rate in grid_param['learning_rate']:
+            objectives = [objectives for key, objectives in grid.objectives_.items()
+                          if grid._points_params[key]['learning_rate'] == learning_rate]
+            objectives = sorted(objectives, key=lambda x: x['model_size'])
+            assert numpy.all(numpy.diff([x['train_time'] for x in objectives]) >= 0)
+        front = grid.pareto_front_
+        assert 1 <= len(front) <= 6
+        assert front[0][1]['score'] == max(generator.grid_scores_.values())
+
+    # estimator without staged predictions is trained for each point
+    generator = RandomParameterOptimizer(OrderedDict({"C": [0.1, 1., 10.]}), n_evaluations=3)
+    counting_scorer = CountingScorer(roc_auc_score_mod)
+    counting_scorer.n_trainings = 0
+    grid = GridOptimalSearchCV(SklearnClassifier(clf=LogisticRegression()), generator, counting_scorer,
+                               stage_param='C')
+    grid.fit(X, y, sample_weight=sample_weight)
+    assert len(generator.grid_scores_) == 3
+    assert counting_scorer.n_trainings == 0
+
+
+def test_folding_scorer():
+    X, y, sample_weight = generate_classification_data()
+    base = SklearnClassifier(clf=AdaBoostClassifier(n_estimators=10, random_state=0))
+    score = FoldingScorer(roc_auc_score_mod, folds=3, fold_checks=3)(base, {}, X, y, sample_weight)
+    assert isinstance(score, FoldingScore)
+    assert len(score.fold_scores) == 3
+    assert numpy.allclose(score, numpy.mean(score.fold_scores))
+    assert numpy.allclose(score.std, numpy.std(score.fold_scores))
+    # splits are computed once for dataset
+    assert _get_folds(X, y, sample_weight, 3, 3) is _get_folds(X, y, sample_weight, 3, 3)
+
+    parallel_score = FoldingScorer(roc_auc_score_mod, folds=3, fold_checks=3,
+                                   parallel_profile='threads-3')(base, {}, X, y, sample_weight)
+    assert numpy.allclose(parallel_score.fold_scores, score.fold_scores)
+    loaded_score = cPickle.loads(cPickle.dumps(score))
+    assert numpy.allclose(loaded_score.fold_scores, score.fold_scores) and loaded_score == score
+    assert list(loaded_score.costs) == ['train_time', 'predict_time', 'model_size']
+    assert all(value > 0 for value in loaded_score.costs.values())
+
+    # splits are not kept after dataset is deleted
+    key = (id(X), id(y), id(sample_weight), len(X), 3, 3)
+    assert key in gridsearch._FOLDS_CACHE
+    del X, y, sample_weight
+    gc.collect()
+    assert key not in gridsearch._FOLDS_CACHE
+
+
+# parameters of trainings done by RecordingScorer
+_TRAINED_PARAMS = []
+
+
+class RecordingScorer(FoldingScorer):
+    def __call__(self, base_estimator, params, X, y, sample_weight=None):
+        _TRAINED_PARAMS.append(params)
+        return FoldingScorer.__call__(self, base_estimator, params, X, y, sample_weight=sample_weight)
+
+
+def test_grid_checkpoint():
+    X, y, sample_weight = generate_classification_data()
+    base = SklearnClassifier(clf=AdaBoostClassifier(random_state=0))
+    grid_param = OrderedDict({"n_estimators": [5, 10, 20], "learning_rate": [0.1, 0.05]})
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'search.sqlite')
+        grid_scores = None
+        for n_evaluations, n_trainings in [(3, 3), (3, 0), (5, 2)]:
+            del _TRAINED_PARAMS[:]
+            generator = RandomParameterOptimizer(grid_param, n_evaluations=n_evaluations, random_state=42)
+            grid = GridOptimalSearchCV(base, generator, RecordingScorer(roc_auc_score_mod), checkpoint_path=path)
+            grid.fit(X, y, sample_weight=sample_weight)
+            assert len(_TRAINED_PARAMS) == n_trainings
+            assert len(generator.grid_scores_) == n_evaluations
+            if grid_scores is not None:
+                # restarted search takes saved results
+                for key, score in grid_scores.items():
+                    assert generator.grid_scores_[key] == score
+            grid_scores = generator.grid_scores_
+    finally:
+        shutil.rmtree(directory)
+
+
+class FakeWorkers(object):
+    """ Computes function of parameters instead of training, results are ready after they are checked twice """
+    def __init__(self, function):
+        self.function = function
+        self.n_running = 0
+        self.max_running = 0
+
+    def submit(self, state_dict, stage_values):
+        self.n_running += 1
+        self.max_running = max(self.max_running, self.n_running)
+        return FakeAsyncResult(self, ('success', self.function(**state_dict)))
+
+
+class FakeAsyncResult(object):
+    def __init__(self, workers, value):
+        self.workers = workers
+        self.value = value
+        self.n_checks = 0
+
+    def ready(self):
+        self.n_checks += 1
+        return self.n_checks > 2
+
+    def wait(self, timeout=None):
+        pass
+
+    def get(self):
+        self.workers.n_running -= 1
+        return self.value
+
+
+def test_grid_asynchronous_scheduling():
+    grid_param = OrderedDict([('x', numpy.linspace(0.1, 1, 10)), ('y', numpy.linspace(0.1, 1, 10))])
+    # annealing generates next point from results of previous ones, so points are evaluated one by one
+    for generator, max_running in [(RandomParameterOptimizer(grid_param, n_evaluations=20), 4),
+                                   (AnnealingParameterOptimizer(grid_param, n_evaluations=20), 1)]:
+        workers = FakeWorkers(lambda x, y: x * y)
+        grid = GridOptimalSearchCV(None, generator, None)
+        grid._fit_asynchronously(4, workers.submit)
+        assert grid.evaluations_done == 20
+        assert len(generator.grid_scores_) == 20
+        assert workers.max_running == max_running, type(generator).__name__
+
+
+def test_grid_asynchronous_halving():
+    # more workers than new points, promoted points are generated when scores of new points are known
+    grid_param = OrderedDict([('x', [0.1, 0.5, 1.]), ('y', [0.1, 1.])])
+    generator = HalvingParameterOptimizer(grid_param, n_evaluations=12, budgets=(1, 3, 9), random_state=42)
+    workers = FakeWorkers(lambda x, y, n_estimators: x * y * (1 - 1. / (n_estimators + 1)))
+    grid = GridOptimalSearchCV(None, generator, None)
+    grid._fit_asynchronously(10, workers.submit)
+    assert grid.evaluations_done == 12
+    assert len(generator.grid_scores_) == 12
+    assert workers.max_running == 6
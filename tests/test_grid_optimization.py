@@ -4,8 +4,11 @@ from collections import OrderedDict
 
 from rep.metaml.gridsearch import SubgridParameterOptimizer, \
     RandomParameterOptimizer, RegressionParameterOptimizer, \
-    AbstractParameterGenerator, AnnealingParameterOptimizer
+    AbstractParameterGenerator, AnnealingParameterOptimizer, HalvingParameterOptimizer, \
+    GaussianProcessParameterOptimizer, ParetoParameterOptimizer, FoldingScore
+from rep.metaml.gridsearch import _get_pareto_front
 import numpy
+from sklearn.linear_model import LinearRegression
 
 __author__ = 'Alex Rogozhnikov'
 
@@ -43,7 +46,8 @@ def test_simple_optimizer(n_evaluations=60):
     }
     parameters = OrderedDict(parameters)
     for generator_type in [RandomParameterOptimizer, RegressionParameterOptimizer,
-                           SubgridParameterOptimizer, AnnealingParameterOptimizer]:
+                           SubgridParameterOptimizer, AnnealingParameterOptimizer,
+                           GaussianProcessParameterOptimizer]:
         print(generator_type.__name__)
         optimizer = FunctionOptimizer(lambda x, y, z, w:  x * y * z * w,
                                       parameter_generator_type=generator_type,
@@ -56,5 +60,102 @@ def test_simple_optimizer(n_evaluations=60):
         optimizer.print_results()
         print('\n\n')
 
+
+def test_halving_optimizer(n_evaluations=60):
+    parameters = OrderedDict([('x', numpy.linspace(0.1, 1, 10)), ('y', numpy.linspace(0.1, 1, 10))])
+    budgets = [2, 6, 18, 54]
+    optimizer = FunctionOptimizer(lambda x, y, n_estimators: x * y * (1 - 1. / n_estimators),
+                                  parameter_generator_type=lambda param_grid, n_evaluations: HalvingParameterOptimizer(
+                                      param_grid, n_evaluations=n_evaluations, random_state=42, budgets=budgets),
+                                  param_grid=parameters,
+                                  n_evaluations=n_evaluations)
+    optimizer.optimize()
+    generator = optimizer.generator
+    assert len(generator.grid_scores_) == n_evaluations
+    n_by_budget = [len(scores) for scores in generator.budget_scores_]
+    assert sum(n_by_budget) == n_evaluations
+    assert numpy.all(numpy.diff(n_by_budget) < 0), n_by_budget
+    assert generator.best_params_['n_estimators'] == budgets[-1]
+    assert generator.best_params_['x'] * generator.best_params_['y'] >= 0.6
+    optimizer.print_results()
+
+
+def test_gaussian_process_optimizer(n_batches=6, batch_size=5):
+    parameters = OrderedDict([('x', numpy.linspace(0.1, 1, 20)), ('y', numpy.linspace(0.1, 1, 20))])
+    generator = GaussianProcessParameterOptimizer(parameters, n_evaluations=n_batches * batch_size, random_state=42)
+    for _ in range(n_batches):
+        batch_indices, batch_params = generator.generate_batch_points(size=batch_size)
+        # constant liar spreads the points of batch
+        assert len(set(batch_indices)) == batch_size
+        for indices, params in zip(batch_indices, batch_params):
+            generator.add_result(indices, -(params['x'] - 0.7) ** 2 - (params['y'] - 0.4) ** 2)
+    assert len(generator.grid_scores_) == n_batches * batch_size
+    assert max(generator.grid_scores_.values()) > -0.01
+    generator.print_results()
+
+
+class CountingRegressor(LinearRegression):
+    n_fits = 0
+
+    def fit(self, X, y, *args, **kwargs):
+        CountingRegressor.n_fits += 1
+        return LinearRegression.fit(self, X, y, *args, **kwargs)
+
+
+def test_regression_optimizer_batches(n_batches=5, batch_size=10):
+    parameters = OrderedDict([('x', numpy.linspace(0.1, 1, 30)), ('y', numpy.linspace(0.1, 1, 30))])
+    for max_candidates in [10000, 100]:
+        CountingRegressor.n_fits = 0
+        generator = RegressionParameterOptimizer(parameters, n_evaluations=n_batches * batch_size, random_state=42,
+                                                 regressor=CountingRegressor(), max_candidates=max_candidates)
+        for _ in range(n_batches):
+            batch_indices, batch_params = generator.generate_batch_points(size=batch_size)
+            assert len(set(batch_indices)) == batch_size
+            for indices, params in zip(batch_indices, batch_params):
+                generator.add_result(indices, params['x'] + params['y'])
+        # first batch is random, then regressor is trained once per batch
+        assert CountingRegressor.n_fits == n_batches - 1
+        assert max(generator.grid_scores_.values()) > 1.9
+
+
+def test_pareto_optimizer(n_evaluations=40):
+    parameters = OrderedDict([('x', numpy.linspace(0.1, 1, 10)), ('y', numpy.linspace(0.1, 1, 10))])
+    generator = ParetoParameterOptimizer(parameters, n_evaluations=n_evaluations, random_state=42)
+    for _ in range(n_evaluations):
+        indices, params = generator.generate_next_point()
+        # quality grows with x and y, prediction time grows with x
+        score = FoldingScore([params['x'] * params['y']], [{'predict_time': params['x'] * 1e-6}])
+        generator.add_result(indices, score)
+    front = generator.pareto_front_
+    assert len(front) >= 4
+    # most points on front have the largest y for their x
+    assert sum(params['y'] == 1 for params, _ in front) > len(front) // 2
+    scores = [objectives['score'] for _, objectives in front]
+    times = [objectives['predict_time'] for _, objectives in front]
+    assert numpy.all(numpy.diff(scores) <= 0) and numpy.all(numpy.diff(times) <= 0)
+
+    points = [({}, OrderedDict([('score', score), ('predict_time', time)]))
+              for score, time in [(1, 3), (1, 2), (0.5, 2), (0.7, 1), (0.3, 0.5), (0.3, 0.7)]]
+    front = _get_pareto_front(points)
+    assert [(o['score'], o['predict_time']) for _, o in front] == [(1, 2), (0.7, 1), (0.3, 0.5)]
+
+
+def test_point_sampling():
+    # grid with 10^9 points
+    generator = RandomParameterOptimizer(OrderedDict([('p%i' % i, list(range(10))) for i in range(9)]),
+                                         n_evaluations=1000)
+    points = [generator.generate_next_point()[0] for _ in range(1000)]
+    assert len(set(points)) == 1000
+
+    # generating until grid is exhausted
+    parameters = OrderedDict([('x', numpy.linspace(0.1, 1, 10)), ('y', numpy.linspace(0.1, 1, 10))])
+    for generator_type in [RandomParameterOptimizer, RegressionParameterOptimizer,
+                           GaussianProcessParameterOptimizer]:
+        optimizer = FunctionOptimizer(lambda x, y: x * y, parameter_generator_type=generator_type,
+                                      param_grid=parameters, n_evaluations=100)
+        optimizer.optimize()
+        assert len(optimizer.generator.grid_scores_) == 100
+
+
 if __name__ == '__main__':
-    test_simple_optimizer()
\ No newline at end of file
+    test_simple_optimizer()
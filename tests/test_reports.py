@@ -1,13 +1,20 @@
 from __future__ import division, print_function, absolute_import
+import gc
+import os
+import shutil
+import tempfile
+import weakref
 
 import numpy
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, AdaBoostClassifier, \
     RandomForestRegressor, GradientBoostingRegressor, AdaBoostRegressor
 from sklearn.metrics import mean_squared_error
 
-from rep.data.storage import LabeledDataStorage
+from rep.data.storage import LabeledDataStorage, MemmapDataStorage
 from rep.metaml import ClassifiersFactory, RegressorsFactory
 from rep.test.test_estimators import generate_classification_sample, generate_regression_sample
+from rep.report import ClassificationReport
+from rep.report._base import _PackedMask
 from rep.report.metrics import RocAuc
 
 
@@ -49,6 +56,83 @@ def test_multiclassification_report():
     _test_classification_report(n_classes=4)
 
 
+def test_report_predictions_cache():
+    classifiers = ClassifiersFactory()
+    classifiers.add_classifier('gb', GradientBoostingClassifier(n_estimators=10))
+    classifiers.add_classifier('rf', RandomForestClassifier())
+    X, y = generate_classification_sample(1000, 5)
+    classifiers.fit(X, y)
+
+    test_lds = LabeledDataStorage(X, y)
+    cache_dir = tempfile.mkdtemp()
+    try:
+        report = ClassificationReport(classifiers, test_lds, parallel_profile='threads-2', cache_dir=cache_dir)
+        predictions = report.prediction.items()
+        assert len(os.listdir(cache_dir)) == len(classifiers)
+        reopened_report = ClassificationReport(classifiers, test_lds, cache_dir=cache_dir)
+        for name, prediction in predictions:
+            assert numpy.all(reopened_report.prediction[name] == prediction)
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_report_releases_data():
+    classifiers = ClassifiersFactory()
+    classifiers.add_classifier('gb', GradientBoostingClassifier(n_estimators=10))
+    X, y = generate_classification_sample(1000, 5)
+    classifiers.fit(X, y)
+
+    directory = tempfile.mkdtemp()
+    try:
+        test_lds = MemmapDataStorage.from_dataframe(X, directory, y)
+        frames = []
+        get_data = test_lds.get_data
+
+        def recording_get_data(features=None):
+            data = get_data(features)
+            if features is None:
+                frames.append(weakref.ref(data))
+            return data
+
+        test_lds.get_data = recording_get_data
+        report = ClassificationReport(classifiers, test_lds)
+        assert report.prediction['gb'].shape == (len(X), 2)
+        gc.collect()
+        # data read from disk is not kept in report after predictions are computed
+        assert len(frames) == 1 and frames[0]() is None
+        report.features_correlation_matrix()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_report_masks_cache():
+    classifiers = ClassifiersFactory()
+    classifiers.add_classifier('gb', GradientBoostingClassifier(n_estimators=10))
+    X, y = generate_classification_sample(1000, 5)
+    classifiers.fit(X, y)
+    report = ClassificationReport(classifiers, LabeledDataStorage(X, y))
+
+    evaluated = []
+    eval_column = report.lds.eval_column
+
+    def counting_eval_column(expression):
+        evaluated.append(expression)
+        return eval_column(expression)
+
+    report.lds.eval_column = counting_eval_column
+    for mask in ['column0 > 0.5', 'column0 > 0.5', 'column1 < 0']:
+        assert numpy.all(report._eval_mask(mask) == eval_column(mask))
+    # the same expression is evaluated once
+    assert evaluated == ['column0 > 0.5', 'column1 < 0']
+
+    # both sparse (indices) and dense (bitmap) masks are restored
+    for mask in [numpy.arange(1001) % 100 == 0, numpy.arange(1001) % 3 == 0]:
+        packed = _PackedMask(mask)
+        assert numpy.all(packed.unpack() == mask) and packed.unpack().dtype == bool
+    assert _PackedMask(numpy.arange(1001) % 100 == 0).indices is not None
+    assert _PackedMask(numpy.arange(1001) % 3 == 0).bits is not None
+
+
 def _classification_mask_report(report, mask, X, labels_dict):
     report.features_correlation_matrix(mask=mask).plot()
     report.features_correlation_matrix_by_class(mask=mask, labels_dict=labels_dict).plot()
@@ -1,7 +1,10 @@
 from __future__ import division, print_function, absolute_import
+from collections import OrderedDict
 
 import numpy
+from sklearn.base import clone
 from sklearn.ensemble import AdaBoostClassifier, BaggingClassifier
+from sklearn.linear_model import LogisticRegression
 
 from rep.test.test_estimators import check_classifier, generate_classification_data
 from rep.estimators import XGBoostClassifier, TMVAClassifier
@@ -32,6 +35,69 @@ def test_feature_splitter():
     assert numpy.allclose(p_final, p), 'end of iterations differs from expected'
 
 
+def test_feature_splitter_parallel():
+    from rep.metaml import FeatureSplitter
+
+    X, y, sample_weight = generate_classification_data()
+    split_column = X.columns[0]
+    X[split_column] = numpy.random.randint(0, 4, size=len(X))
+    base = SklearnClassifier(clf=AdaBoostClassifier(n_estimators=10, random_state=0))
+    train = X[split_column] != 3
+    fs = FeatureSplitter(base_estimator=base, split_feature=split_column, train_features=list(X.columns[1:]))
+    fs.fit(X[train], y[train], sample_weight=sample_weight[train])
+    p_final = fs.predict_proba(X)
+    for value, estimator in fs.base_estimators.items():
+        rows = (X[split_column] == value).values
+        assert numpy.allclose(p_final[rows], estimator.predict_proba(X.loc[rows, X.columns[1:]]))
+    # value of split feature not present in training
+    assert numpy.all(p_final[(X[split_column] == 3).values] == 0)
+    for p in fs.staged_predict_proba(X):
+        pass
+    assert numpy.allclose(p_final, p), 'end of iterations differs from expected'
+
+    for parallel_profile in ['threads-2', 'processes-2']:
+        parallel_fs = clone(fs).set_params(parallel_profile=parallel_profile)
+        parallel_fs.fit(X[train], y[train], sample_weight=sample_weight[train])
+        assert numpy.allclose(parallel_fs.predict_proba(X), p_final), parallel_profile
+
+
+class RecordingClassifier(SklearnClassifier):
+    def fit(self, X, y, sample_weight=None):
+        self.train_meta_features = X.copy()
+        return SklearnClassifier.fit(self, X, y, sample_weight=sample_weight)
+
+
+def test_stacking_classifier():
+    from rep.metaml import StackingClassifier
+
+    base_estimators = OrderedDict([('ada', SklearnClassifier(clf=AdaBoostClassifier(n_estimators=10, random_state=0))),
+                                   ('logistic', SklearnClassifier(clf=LogisticRegression()))])
+    meta_estimator = SklearnClassifier(clf=AdaBoostClassifier(n_estimators=5, random_state=0))
+    check_classifier(StackingClassifier(base_estimators, meta_estimator, random_state=42), has_importances=False)
+    check_classifier(StackingClassifier(base_estimators, meta_estimator, random_state=42), has_importances=False,
+                     n_classes=3)
+
+    X, y, sample_weight = generate_classification_data()
+    stacking = StackingClassifier(base_estimators, RecordingClassifier(clf=LogisticRegression()), n_folds=3,
+                                  random_state=42)
+    stacking.fit(X, y, sample_weight=sample_weight)
+    assert list(stacking.estimators) == ['ada', 'logistic']
+    meta_features = stacking.meta_classifier.train_meta_features
+    assert list(meta_features.columns) == ['ada_1', 'logistic_1']
+    # meta-classifier is trained on out-of-fold predictions
+    for rows in stacking._get_folds_rows(len(X)):
+        train_rows = numpy.setdiff1d(numpy.arange(len(X)), rows)
+        ada = clone(base_estimators['ada']).fit(X.iloc[train_rows, :], y[train_rows],
+                                                sample_weight=sample_weight[train_rows])
+        assert numpy.allclose(meta_features['ada_1'].values[rows], ada.predict_proba(X.iloc[rows, :])[:, 1])
+
+    for parallel_profile in ['threads-3', 'processes-2']:
+        parallel_stacking = StackingClassifier(base_estimators, RecordingClassifier(clf=LogisticRegression()),
+                                               n_folds=3, random_state=42, parallel_profile=parallel_profile)
+        parallel_stacking.fit(X, y, sample_weight=sample_weight)
+        assert numpy.allclose(parallel_stacking.predict_proba(X), stacking.predict_proba(X)), parallel_profile
+
+
 def test_simple_stacking_xgboost():
     base_xgboost = XGBoostClassifier()
     classifier = SklearnClassifier(clf=AdaBoostClassifier(base_estimator=base_xgboost, n_estimators=3))
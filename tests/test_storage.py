@@ -0,0 +1,67 @@
+from __future__ import division, print_function, absolute_import
+
+import tempfile
+import shutil
+
+import numpy
+
+from rep.data import LabeledDataStorage, MemmapDataStorage
+from rep.test.test_estimators import generate_classification_data
+
+__author__ = 'Tatiana Likhomanenko'
+
+
+def check_storages_equal(lds, other, features):
+    assert len(lds) == len(other)
+    assert numpy.all(lds.get_targets() == other.get_targets())
+    assert numpy.all(lds.get_weights() == other.get_weights())
+    assert numpy.allclose(lds.get_data(features).values, other.get_data(features).values)
+    assert list(lds.get_data().columns) == list(other.get_data().columns)
+    assert numpy.allclose(lds.col(features[0]), other.col(features[0]))
+    assert numpy.all(lds.eval_column('column0 > 0') == other.eval_column('column0 > 0'))
+
+
+def test_memmap_storage():
+    X, y, sample_weight = generate_classification_data()
+    features = ['column0', 'new: column1 * column2 + 1']
+    directory = tempfile.mkdtemp()
+    try:
+        for shuffle in [False, True]:
+            lds = LabeledDataStorage(X, y, sample_weight, random_state=42, shuffle=shuffle)
+            memmap_lds = MemmapDataStorage.from_dataframe(X, directory, y, sample_weight,
+                                                          random_state=42, shuffle=shuffle)
+            check_storages_equal(lds, memmap_lds, features)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_save_load_storage():
+    X, y, sample_weight = generate_classification_data()
+    features = ['column0', 'new: column1 * column2 + 1']
+    directory = tempfile.mkdtemp()
+    try:
+        lds = LabeledDataStorage(X, y, sample_weight, shuffle=True)
+        lds.save(directory)
+        for mmap in [True, False]:
+            loaded_lds = LabeledDataStorage.load(directory, mmap=mmap)
+            assert isinstance(loaded_lds, MemmapDataStorage) == mmap
+            check_storages_equal(lds, loaded_lds, features)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_shuffled_storage():
+    X, y, sample_weight = generate_classification_data()
+    lds = LabeledDataStorage(X, y, sample_weight, shuffle=True)
+    indices = lds.get_indices()
+    assert numpy.all(lds.get_data().values == X.values[indices])
+    assert numpy.all(lds.get_data().index == X.index[indices])
+    assert numpy.allclose(lds.get_data(['new: column0 + column1']).values[:, 0],
+                          (X['column0'] + X['column1']).values[indices])
+    assert numpy.all(lds.get_data(['column0']).index == X.index[indices])
+    # permuted data frame is built once
+    assert lds.get_data() is lds.get_data()
+    assert numpy.all(lds.get_targets() == y[indices])
+    # permuted targets and weights are computed once
+    assert lds.get_targets() is lds.get_targets()
+    assert lds.get_weights() is lds.get_weights()
@@ -2,7 +2,10 @@ from __future__ import print_function, division, absolute_import
 
 __author__ = 'Tatiana Likhomanenko'
 
+import gc
+
 from rep import utils
+from rep.test.test_estimators import generate_classification_sample
 import numpy
 
 
@@ -38,3 +41,22 @@ def test_train_test_split_group():
     train, test = utils.train_test_split_group(group_column, data)
     assert len(set.intersection(set(test), set(train))) == 0
 
+
+def test_get_columns_in_df():
+    X, _ = generate_classification_sample(1000, 4)
+    features = ['column0', 'new: column1 * column2', 'other: column1 * column2', 'column3 + 1']
+    result = utils.get_columns_in_df(X, features)
+    assert list(result.columns) == ['column0', 'new', 'other', 'column3 + 1']
+    assert numpy.all(result['column0'] == X['column0'])
+    assert numpy.allclose(result['new'], X['column1'] * X['column2'])
+    assert numpy.allclose(result['other'], X['column1'] * X['column2'])
+    assert numpy.allclose(result['column3 + 1'], X['column3'] + 1)
+    # memoized results are recomputed after replacing the column
+    X['column1'] = X['column1'] * 2
+    assert numpy.allclose(utils.get_columns_in_df(X, features)['new'], X['column1'] * X['column2'])
+    # memoized results are forgotten together with data frame
+    key = id(X)
+    assert key in utils._EXPRESSIONS_CACHE
+    del X, result
+    gc.collect()
+    assert key not in utils._EXPRESSIONS_CACHE